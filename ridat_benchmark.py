@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+"""
+Reproducible benchmarks for ridat_reader. Synthetic .RiDat files are generated with "write_ridat_file", from 1k up to
+10M points, and the main functions are timed on them:
+....read_ridat_file
+....read_ridat_header (decoding all the parameters)
+....export_ridat_data_to_text_file (only up to --export-max-points, since text formatting is much slower)
+
+Each benchmark runs in its own process, so its peak RSS is not inflated by the previous ones. The results (best time,
+MB/s of the .RiDat file and peak RSS) are printed, and can be saved as JSON with --output and compared against a
+previous run with --compare:
+
+    python ridat_benchmark.py --output before.json
+    python ridat_benchmark.py --output after.json --compare before.json
+
+This is a free software with a MIT License.
+"""
+
+import argparse
+import concurrent.futures
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+
+import ridat_reader
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000, 10000000)
+
+
+# writes a synthetic CPMG-like acquisition (a noisy decaying echo train) with "num_points" points.
+def generate_ridat_file(f_path, num_points, seed=0):
+    random = np.random.default_rng(seed)
+    time_values = np.arange(num_points, dtype=np.float64) * 2.0 + 1.0
+    decay = 1000.0 * np.exp(-time_values / (time_values[-1] / 3.0 if num_points else 1.0))
+    real_values = decay + random.normal(0.0, 5.0, num_points)
+    imag_values = random.normal(0.0, 5.0, num_points)
+
+    parameters = ridat_reader.AcquisitionParameters(ridat_reader.SysParameters(), ridat_reader.AppParameters(),
+                                                    ridat_reader.ProcessingParameters(), "benchmark")
+    parameters.app.SI = num_points
+    parameters.app.DW = 2.0
+    parameters.app.NECH = 1
+    parameters.app.NS = 1
+    parameters.app.SequenceName = "CPMG"
+    ridat_reader.write_ridat_file(f_path, time_values, real_values, imag_values, parameters)
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, and in kilobytes everywhere else.
+    return peak / 1024.0 ** 2 if sys.platform == 'darwin' else peak / 1024.0
+
+
+# runs one benchmark "repeat" times, inside a worker process. Returns the best time and the peak RSS.
+def _run_benchmark(benchmark, ridat_path, export_path, repeat):
+    if benchmark == 'read_ridat_file':
+        function = lambda: ridat_reader.read_ridat_file(ridat_path)
+    elif benchmark == 'read_ridat_header':
+        # the parameters are decoded lazily, so to_dict() is called to time the decoding of every field.
+        function = lambda: ridat_reader.read_ridat_header(ridat_path).to_dict()
+    elif benchmark == 'export_ridat_data_to_text_file':
+        function = lambda: ridat_reader.export_ridat_data_to_text_file(ridat_path, export_path)
+    else:
+        raise ValueError("Unknown benchmark %s" % benchmark)
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best, _peak_rss_mb()
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, repeat=3, export_max_points=1000000, data_dir=None, log=print):
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        data_dir = data_dir or temp_dir
+        for num_points in sizes:
+            ridat_path = os.path.join(data_dir, 'benchmark_%d.RiDat' % num_points)
+            if not os.path.exists(ridat_path):
+                generate_ridat_file(ridat_path, num_points)
+            file_bytes = os.path.getsize(ridat_path)
+
+            benchmarks = ['read_ridat_file', 'read_ridat_header']
+            if num_points <= export_max_points:
+                benchmarks.append('export_ridat_data_to_text_file')
+            for benchmark in benchmarks:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
+                    seconds, peak_rss_mb = executor.submit(_run_benchmark, benchmark, ridat_path,
+                                                           os.path.join(temp_dir, 'export.txt'), repeat).result()
+                result = {'benchmark': benchmark, 'points': num_points, 'file_bytes': file_bytes,
+                          'seconds': seconds, 'mb_per_second': file_bytes / 1e6 / seconds if seconds else None,
+                          'peak_rss_mb': peak_rss_mb}
+                results.append(result)
+                log("%-32s %10d points  %10.6f s  %9.1f MB/s  peak RSS %s MB"
+                    % (benchmark, num_points, seconds, result['mb_per_second'] or 0.0,
+                       '%.1f' % peak_rss_mb if peak_rss_mb is not None else '?'))
+    return results
+
+
+# prints the speedup of each benchmark against a previous JSON output (> 1 means faster than before).
+def compare_results(results, baseline, log=print):
+    previous = {(result['benchmark'], result['points']): result for result in baseline['results']}
+    for result in results:
+        before = previous.get((result['benchmark'], result['points']))
+        if before is None:
+            continue
+        log("%-32s %10d points  %6.2fx speedup  (%.6f s -> %.6f s)"
+            % (result['benchmark'], result['points'], before['seconds'] / result['seconds'],
+               before['seconds'], result['seconds']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for ridat_reader.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help="numbers of points")
+    parser.add_argument('--repeat', type=int, default=3, help="runs of each benchmark (the best one is kept)")
+    parser.add_argument('--export-max-points', type=int, default=1000000,
+                        help="largest file for the text export benchmark")
+    parser.add_argument('--data-dir', help="keep the generated files in this directory, to reuse them")
+    parser.add_argument('--output', help="save the results in this JSON file")
+    parser.add_argument('--compare', help="JSON file of a previous run to compare against")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.repeat, args.export_max_points, args.data_dir)
+    report = {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+              'ridat_reader': ridat_reader.__version__, 'results': results}
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=1)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            compare_results(results, json.load(baseline_file))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+
+"""
+Laplace inversion of .RiDat relaxation measurements: CPMG echo trains into T2 distributions, and inversion or
+saturation recovery curves into T1 distributions. Each decay is fitted as a sum of exponentials over a grid of
+relaxation times, solving a non-negative least squares problem with Tikhonov regularization:
+....minimize ||K f - signal||^2 + alpha ||f||^2, with f >= 0
+....where K is the kernel, one column per relaxation time of the grid (e.g. exp(-t / T2))
+
+The kernel of each (time axis, relaxation grid) pair is built and compressed with an SVD only once, and kept in a
+"KernelCache" (least recently used entries are evicted). The problems of a whole stack of acquisitions are then solved
+together with FISTA (accelerated projected gradient): each iteration is a couple of matrix products over the whole
+stack, which numpy's BLAS spreads over all cores, so the throughput is set by the solver and not by the kernel setup.
+
+"invert_relaxation" works on any stack of decays measured at the same times, and "invert_cpmg" takes the signals and
+AcquisitionParameters of .RiDat files (e.g. from read_ridat_files), with the echo times given by NECH and tau.
+The times and relaxation times are in the same unit (the unit of tau in the files).
+
+This is a free software with a MIT License.
+"""
+
+import collections
+import hashlib
+import threading
+import warnings
+import numpy as np
+
+from ridat_processing import echo_peaks
+
+
+# Kernels, from the times (m,) and relaxation times (n,) to a (m, n) matrix.
+def t2_kernel(times, relaxation_times):
+    return np.exp(-np.asarray(times, dtype=np.float64)[:, np.newaxis] / np.asarray(relaxation_times)[np.newaxis, :])
+
+
+# inversion recovery: 1 - 2 exp(-t / T1).
+def t1_inversion_kernel(times, relaxation_times):
+    return 1.0 - 2.0 * t2_kernel(times, relaxation_times)
+
+
+# saturation recovery: 1 - exp(-t / T1).
+def t1_saturation_kernel(times, relaxation_times):
+    return 1.0 - t2_kernel(times, relaxation_times)
+
+
+KERNELS = {'T2': t2_kernel, 'T1_inversion': t1_inversion_kernel, 'T1_saturation': t1_saturation_kernel}
+
+
+# log-spaced grid of "points" relaxation times between t_min and t_max.
+def relaxation_grid(t_min, t_max, points=100):
+    if not 0 < t_min < t_max:
+        raise ValueError("The relaxation grid needs 0 < t_min < t_max.")
+    return np.logspace(np.log10(t_min), np.log10(t_max), points)
+
+
+# default grid for decays measured at "times": from the first time to 10 times the last one.
+def _default_grid(times, points=100):
+    times = np.asarray(times, dtype=np.float64)
+    positive = times[times > 0]
+    if positive.size == 0:
+        raise ValueError("The times must have positive values to choose a relaxation grid.")
+    return relaxation_grid(positive.min(), 10.0 * positive.max(), points)
+
+
+# echo times of a CPMG train, t_k = 2 * tau * k for k = 1 .. NECH, from its Application parameters.
+def cpmg_echo_times(app_parameters):
+    return 2.0 * float(app_parameters.tau) * np.arange(1, app_parameters.NECH + 1)
+
+
+# The kernel of a (time axis, relaxation grid) pair compressed with its SVD, K = U S Vt, keeping the singular values
+# above "rtol" times the largest one. With the signals projected on U ("project"), the least squares problem only has
+# "rank" rows instead of one per time (usually 10-20 instead of thousands of echoes). "gram" (the compressed kernel's
+# K^T K) and "lipschitz" (its largest eigenvalue) are what the solver needs.
+class CompressedKernel(object):
+    def __init__(self, kernel, times, relaxation_times, rtol=1e-6):
+        self.kernel = kernel
+        self.times = np.asarray(times, dtype=np.float64)
+        self.relaxation_times = np.asarray(relaxation_times, dtype=np.float64)
+        u, s, vt = np.linalg.svd(KERNELS[kernel](self.times, self.relaxation_times), full_matrices=False)
+        rank = max(int(np.count_nonzero(s > s[0] * rtol)), 1)
+        self.basis = u[:, :rank]
+        self.compressed = s[:rank, np.newaxis] * vt[:rank]
+        self.gram = self.compressed.T @ self.compressed
+        self.lipschitz = max(float(s[0]) ** 2, np.finfo(np.float64).tiny)
+
+    @property
+    def rank(self):
+        return self.basis.shape[1]
+
+    @property
+    def nbytes(self):
+        return self.basis.nbytes + self.compressed.nbytes + self.gram.nbytes
+
+    # signals (..., times) -> (..., rank) coordinates in the kernel's range.
+    def project(self, signals):
+        return signals @ self.basis
+
+    # the decays fitted by distributions (..., relaxation times), at the kernel's times.
+    def forward(self, distributions):
+        return (distributions @ self.compressed.T) @ self.basis.T
+
+
+# LRU cache of CompressedKernel, keyed on the kernel name, the tolerance, and hashes of the time axis and relaxation
+# grid, so the kernel of each setup is built once however many acquisitions use it. At most "max_entries" kernels
+# are kept. The "hits", "misses" and "evictions" counters (and the "stats" method) can be forwarded to a monitoring
+# system, like those of ridat_reader.RiDatCache.
+class KernelCache(object):
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self.hits, self.misses, self.evictions = 0, 0, 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, kernel, times, relaxation_times, rtol=1e-6):
+        if kernel not in KERNELS:
+            raise ValueError("Unknown kernel %r. Use one of %s." % (kernel, ', '.join(sorted(KERNELS))))
+        times = np.ascontiguousarray(times, dtype=np.float64)
+        relaxation_times = np.ascontiguousarray(relaxation_times, dtype=np.float64)
+        key = (kernel, rtol, times.size, hashlib.sha1(times.tobytes()).hexdigest(),
+               relaxation_times.size, hashlib.sha1(relaxation_times.tobytes()).hexdigest())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = CompressedKernel(kernel, times, relaxation_times, rtol)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self._entries), 'max_entries': self.max_entries}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# cache used when the inversion functions are not given one.
+DEFAULT_KERNEL_CACHE = KernelCache()
+
+
+# FISTA for min ||A f - d||^2 + alpha ||f||^2 with f >= 0, for every row of "projected" (the signals projected on
+# the kernel's basis) at once. Each row has its own step (from its alpha) and its own momentum, which is reset when
+# it stops decreasing the objective (adaptive restart), so slow rows don't hold the others back. A row is left out
+# of the following iterations as soon as its relative change is below "tol". Returns the distributions, the number
+# of iterations of each row, and which rows converged within "max_iterations".
+def _solve_nnls(compressed_kernel, projected, alpha, max_iterations, tol):
+    rows = projected.shape[0]
+    alpha = np.broadcast_to(np.asarray(alpha, dtype=np.float64).reshape(-1, 1), (rows, 1))
+    step = 1.0 / (compressed_kernel.lipschitz + alpha)
+    target = projected @ compressed_kernel.compressed
+
+    distributions = np.zeros((rows, compressed_kernel.relaxation_times.size))
+    extrapolated = distributions.copy()
+    momentum = np.ones((rows, 1))
+    iterations = np.zeros(rows, dtype=np.int64)
+    active = np.arange(rows)
+    for iteration in range(1, max_iterations + 1):
+        if not active.size:
+            break
+        current, previous = extrapolated[active], distributions[active]
+        gradient = current @ compressed_kernel.gram + alpha[active] * current - target[active]
+        updated = np.maximum(current - step[active] * gradient, 0.0)
+        change = updated - previous
+
+        row_momentum = momentum[active]
+        row_momentum[np.einsum('ij,ij->i', current - updated, change) > 0] = 1.0
+        next_momentum = (1.0 + np.sqrt(1.0 + 4.0 * row_momentum ** 2)) / 2.0
+        extrapolated[active] = updated + ((row_momentum - 1.0) / next_momentum) * change
+        momentum[active] = next_momentum
+        distributions[active] = updated
+        iterations[active] = iteration
+
+        change_norm = np.linalg.norm(change, axis=1)
+        active = active[change_norm > tol * np.maximum(np.linalg.norm(updated, axis=1), np.finfo(np.float64).tiny)]
+    converged = np.ones(rows, dtype=bool)
+    converged[active] = False
+    return distributions, iterations, converged
+
+
+# Inverts decays measured at the same "times" into distributions of relaxation times. "signals" is one decay
+# (points,) or a stack of them (acquisitions, points); "kernel" is 'T2', 'T1_inversion' or 'T1_saturation';
+# "alpha" (a scalar or one value per acquisition) is the regularization weight, in the units of the signal squared.
+# "relaxation_times" defaults to 100 log-spaced values from the first time to 10 times the last one.
+# Returns the relaxation times and the distributions (one row per acquisition, or 1D for a single decay).
+# A RuntimeWarning is issued when some decays have not converged within "max_iterations".
+def invert_relaxation(times, signals, relaxation_times=None, kernel='T2', alpha=1.0, rtol=1e-6,
+                      max_iterations=5000, tol=1e-6, cache=None):
+    times = np.asarray(times, dtype=np.float64)
+    signals = np.asarray(signals, dtype=np.float64)
+    if signals.shape[-1] != times.size:
+        raise ValueError("The signals have %d points, but there are %d times." % (signals.shape[-1], times.size))
+    if relaxation_times is None:
+        relaxation_times = _default_grid(times)
+    compressed_kernel = (DEFAULT_KERNEL_CACHE if cache is None else cache).get(kernel, times, relaxation_times, rtol)
+
+    stack = np.atleast_2d(signals)
+    distributions, _, converged = _solve_nnls(compressed_kernel, compressed_kernel.project(stack), alpha,
+                                              max_iterations, tol)
+    if not converged.all():
+        warnings.warn("%d of %d decays did not converge in %d iterations (tol=%g). Increase max_iterations or tol."
+                      % (converged.size - np.count_nonzero(converged), converged.size, max_iterations, tol),
+                      RuntimeWarning, stacklevel=2)
+    return compressed_kernel.relaxation_times, distributions[0] if signals.ndim == 1 else distributions
+
+
+# Inverts CPMG echo trains from .RiDat files into T2 distributions. "signals" is one train or a stack of them (one
+# row per file, e.g. the real part of read_ridat_files or process_acquisitions, NaN-padded rows included), and
+# "acquisition_parameters" the matching AcquisitionParameters (or a list of them). Rows with exactly NECH valid
+# points are taken as one value per echo; longer rows are decimated with ridat_processing.echo_peaks ("echo_mode").
+# The echo times come from NECH and tau, and the acquisitions sharing the same echo times are solved in one batch
+# with one cached kernel. "alpha" can be a scalar or have one value per acquisition.
+# Returns the relaxation times and the T2 distributions (one row per acquisition, or 1D for a single train).
+def invert_cpmg(signals, acquisition_parameters, relaxation_times=None, alpha=1.0, echo_mode='max', rtol=1e-6,
+                max_iterations=5000, tol=1e-6, cache=None):
+    single = np.ndim(signals) == 1
+    parameters = [acquisition_parameters] if single else list(acquisition_parameters)
+    stack = np.real(np.atleast_2d(signals)).astype(np.float64)
+    if stack.shape[0] != len(parameters):
+        raise ValueError("There are %d signals, but %d acquisition parameters." % (stack.shape[0], len(parameters)))
+    alpha = np.broadcast_to(np.asarray(alpha, dtype=np.float64), (len(parameters),))
+
+    # acquisitions with the same echo times share a kernel, and are solved together.
+    groups = collections.OrderedDict()
+    for row, params in enumerate(parameters):
+        echo_times = cpmg_echo_times(params.app)
+        groups.setdefault(echo_times.tobytes(), (echo_times, []))[1].append(row)
+    if relaxation_times is None:
+        relaxation_times = _default_grid(np.concatenate([echo_times for echo_times, _ in groups.values()]))
+    relaxation_times = np.asarray(relaxation_times, dtype=np.float64)
+
+    distributions = np.zeros((len(parameters), relaxation_times.size))
+    for echo_times, rows in groups.values():
+        echoes = np.empty((len(rows), echo_times.size))
+        for position, row in enumerate(rows):
+            valid = stack[row][~np.isnan(stack[row])]
+            echoes[position] = valid if valid.size == echo_times.size else echo_peaks(valid, echo_times.size,
+                                                                                      mode=echo_mode)
+        _, distributions[rows] = invert_relaxation(echo_times, echoes, relaxation_times, 'T2', alpha[rows], rtol,
+                                                   max_iterations, tol, cache)
+    return relaxation_times, distributions[0] if single else distributions
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+"""
+Processing of .RiDat acquisitions with the parameters stored in the files themselves. Every function works on the last
+axis of its inputs, so a single acquisition (1D arrays) and a whole stack of acquisitions (2D arrays, one row per file,
+as returned by "read_ridat_files") are processed the same way, with one vectorized numpy pass:
+....baseline_correct: subtraction of the mean of the last points of each acquisition
+....apodize: exponential line broadening (LB of the Processing parameters)
+....phase_correct: zero and first order phase correction (PA, PB and PivotPoint of the Processing parameters)
+....echo_peaks: decimation of an echo train into one point per echo (NECH and SI of the Application parameters)
+
+"process_acquisitions" applies all of them, taking the parameters of each acquisition from its AcquisitionParameters.
+The time values of the files are in microseconds, and LB is in Hz.
+
+This is a free software with a MIT License.
+"""
+
+import numpy as np
+
+
+# makes per-acquisition parameters (scalars, or one value per row) broadcastable against (..., points) arrays.
+def _per_acquisition(values):
+    return np.asarray(values, dtype=np.float64)[..., np.newaxis]
+
+
+# Phase correction of a complex signal: each point k is rotated by PA + PB * (k - pivot) / points (in degrees).
+# "pa", "pb" and "pivot" can be scalars or have one value per acquisition.
+# The first order term (PB around "pivot") is linear in frequency, so it only makes sense on a spectrum (the FFT of
+# the time-domain signal). On time-domain data, a phase ramp would shift the frequencies instead, so only use "pa".
+def phase_correct(signal, pa, pb=0.0, pivot=0):
+    signal = np.asarray(signal)
+    points = signal.shape[-1]
+    relative_position = (np.arange(points) - _per_acquisition(pivot)) / max(points, 1)
+    phase = np.deg2rad(_per_acquisition(pa) + _per_acquisition(pb) * relative_position)
+    return signal * np.exp(1j * phase)
+
+
+# Exponential apodization (line broadening) by "lb" Hz: multiplies the signal by exp(-pi * lb * t).
+# "time_scale" converts the time values to seconds (the files store them in microseconds).
+def apodize(signal, time_values, lb, time_scale=1e-6):
+    return np.asarray(signal) * np.exp(-np.pi * _per_acquisition(lb) * np.asarray(time_values) * time_scale)
+
+
+# Subtracts from each acquisition the mean of its last "baseline_fraction" points, where the signal has decayed.
+# "num_points" gives the number of valid points of each row for NaN-padded stacks (from read_ridat_files), and
+# "apply" (one boolean per acquisition) selects which acquisitions are corrected.
+def baseline_correct(signal, baseline_fraction=0.1, num_points=None, apply=True):
+    signal = np.asarray(signal)
+    points = signal.shape[-1]
+    if num_points is None:
+        num_points = points
+    num_points = _per_acquisition(num_points)
+    window = np.maximum(np.round(num_points * baseline_fraction), 1.0)
+
+    position = np.arange(points)
+    in_window = (position >= num_points - window) & (position < num_points)
+    baseline = np.where(in_window, np.nan_to_num(signal), 0).sum(axis=-1, keepdims=True) / window
+    return signal - baseline * _per_acquisition(apply).astype(bool)
+
+
+# Decimates an echo train into one point per echo. The signal is split in "nech" echoes of "points_per_echo" points
+# (by default, all the points divided evenly between the echoes), and each echo is reduced to its point of largest
+# magnitude ("max"), its central point ("center") or its mean ("mean"). If "time_values" is given, the time of the
+# chosen points (or of the center, for "mean") is returned too.
+def echo_peaks(signal, nech, points_per_echo=None, time_values=None, mode='max'):
+    signal = np.asarray(signal)
+    if points_per_echo is None:
+        points_per_echo = signal.shape[-1] // nech
+    if nech * points_per_echo > signal.shape[-1] or points_per_echo < 1:
+        raise ValueError("The signal has %d points, which is less than %d echoes of %d points."
+                         % (signal.shape[-1], nech, points_per_echo))
+
+    echoes = signal[..., :nech * points_per_echo].reshape(signal.shape[:-1] + (nech, points_per_echo))
+    if mode == 'max':
+        index = np.argmax(np.abs(np.nan_to_num(echoes)), axis=-1)[..., np.newaxis]
+    elif mode in ('center', 'mean'):
+        index = np.full(echoes.shape[:-1] + (1,), points_per_echo // 2)
+    else:
+        raise ValueError("Unknown mode %r. Use 'max', 'center' or 'mean'." % mode)
+    peaks = echoes.mean(axis=-1) if mode == 'mean' else np.take_along_axis(echoes, index, axis=-1)[..., 0]
+
+    if time_values is None:
+        return peaks
+    time_values = np.broadcast_to(time_values, signal.shape)
+    echo_times = time_values[..., :nech * points_per_echo].reshape(echoes.shape)
+    return np.take_along_axis(echo_times, index, axis=-1)[..., 0], peaks
+
+
+# Applies the processing stored in the files to one acquisition or a stack of acquisitions: baseline correction (for
+# the acquisitions with NOBC == 0), then apodization (LB), so that a DC offset is removed before it is shaped by the
+# exponential, then zero order phase correction (PA) and, if "decimate_echoes" is True, echo-peak decimation with NECH
+# and SI (SI is used as the number of points per echo when NECH * SI matches the number of points).
+# The data stays in the time domain, so the first order phase (PB, PivotPoint) is not applied: it belongs to the
+# spectrum, and can be applied with phase_correct after an FFT along the last axis.
+# PPBL is not used either: it is a double stored with the peak picking settings (PPRF, PPTH, PPAF), not a flag,
+# and the format does not say how it would set the baseline, so the baseline correction only follows NOBC, over
+# the last "baseline_fraction" of each acquisition.
+# "acquisition_parameters" is an AcquisitionParameters or a list of them, one per row.
+# Returns the time, real and imag arrays after processing.
+def process_acquisitions(time_values, real_values, imag_values, acquisition_parameters, num_points=None,
+                         baseline_fraction=0.1, decimate_echoes=False, echo_mode='max'):
+    single = np.ndim(real_values) == 1
+    parameters = [acquisition_parameters] if single else list(acquisition_parameters)
+    time_values = np.atleast_2d(time_values)
+    signal = np.atleast_2d(real_values) + 1j * np.atleast_2d(imag_values)
+
+    proc = [params.proc for params in parameters]
+    signal = baseline_correct(signal, baseline_fraction, num_points, [p.NOBC == 0 for p in proc])
+    signal = apodize(signal, time_values, [p.LB for p in proc])
+    signal = phase_correct(signal, [p.PA for p in proc])
+
+    if decimate_echoes:
+        nech = {params.app.NECH for params in parameters}
+        si = {params.app.SI for params in parameters}
+        if len(nech) != 1:
+            raise ValueError("All the acquisitions must have the same NECH to be decimated together.")
+        nech = nech.pop()
+        points_per_echo = si.pop() if len(si) == 1 else None
+        if points_per_echo is not None and nech * points_per_echo != signal.shape[-1]:
+            points_per_echo = None
+        time_values, signal = echo_peaks(signal, nech, points_per_echo, time_values, echo_mode)
+
+    if single:
+        return time_values[0], signal.real[0], signal.imag[0]
+    return time_values, signal.real, signal.imag
@@ -17,32 +17,48 @@ Created by Pedro Vianna Mesquita -> pedroviannamesquita@gmail.com
 
 #include "ridat_reader.h"
 
+#include <algorithm>
+#include <atomic>
+#include <cstring>
+#include <exception>
+#include <sstream>
+#include <thread>
+
+// size in bytes of each record of the data section: real (float), imaginary (float) and time (double).
+static const int RIDAT_RECORD_SIZE = 16;
+
+// size in bytes of the fields parsed from each header section (identification, System, Application, Processing).
+static const int RIDAT_ID_SECTION_SIZE = 156;
+static const int RIDAT_SYS_SECTION_SIZE = 592;
+static const int RIDAT_APP_SECTION_SIZE = 1512;
+static const int RIDAT_PROC_SECTION_SIZE = 108;
+
 ///////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
 ////////////////////////////////////////////////////////////////////////////// FUNCTIONS FOR READING DATA FROM BINARY FILES
 
 
-static int read_int_from_binary_file(ifstream& file_stream)
+static int read_int_from_binary_file(std::istream& file_stream)
 {
 	int value;
 	file_stream.read(reinterpret_cast<char*>(&value), 4);
 	return value;
 }
 
-static float read_float_from_binary_file(ifstream& file_stream)
+static float read_float_from_binary_file(std::istream& file_stream)
 {
 	float value;
 	file_stream.read(reinterpret_cast<char*>(&value), 4);
 	return value;
 }
 
-static double read_double_from_binary_file(ifstream& file_stream)
+static double read_double_from_binary_file(std::istream& file_stream)
 {
 	double value;
 	file_stream.read(reinterpret_cast<char*>(&value), 8);
 	return value;
 }
 
-static string read_string_from_binary_file(ifstream& file_stream, int lenght)
+static string read_string_from_binary_file(std::istream& file_stream, int lenght)
 {
 	char* temp = new char[lenght + 1];
 	file_stream.read(temp, lenght);
@@ -53,12 +69,12 @@ static string read_string_from_binary_file(ifstream& file_stream, int lenght)
 }
 
 
-static void read_data_from_binary_file_to_array(ifstream& file_stream, int* array_ptr, int size)
+static void read_data_from_binary_file_to_array(std::istream& file_stream, int* array_ptr, int size)
 {
 	for (int i = 0; i < size; i++) { array_ptr[i] = read_int_from_binary_file(file_stream); }
 }
 
-static void read_data_from_binary_file_to_array(ifstream& file_stream, float* array_ptr, int size)
+static void read_data_from_binary_file_to_array(std::istream& file_stream, float* array_ptr, int size)
 {
 	for (int i = 0; i < size; i++) { array_ptr[i] = read_float_from_binary_file(file_stream); }
 }
@@ -100,255 +116,349 @@ int readRiDatFile(string file_path, RiDatAcqData& acq_data)
 	const int Sect2Size = read_int_from_binary_file(ridat_file);
 	const int Sect3Size = read_int_from_binary_file(ridat_file);
 	const int Sect4Size = read_int_from_binary_file(ridat_file);
+	const std::streamoff data_offset = (std::streamoff)Sect1Size + Sect2Size + Sect3Size + Sect4Size;
+
+	// the section sizes are checked against the length of the file before anything is allocated from them, so a
+	// corrupt header can not ask for a negative or huge buffer.
+	ridat_file.seekg(0, std::ios::end);
+	const std::streamoff file_size = (std::streamoff)ridat_file.tellg();
+	if (Sect1Size < 0 || Sect2Size < 0 || Sect3Size < 0 || Sect4Size < 0 || data_offset > file_size)
+	{
+		cout << "The section sizes of the file are invalid. File is corrupted." << endl;
+		return -4;
+	}
+
+	// the whole header (everything before the data section) is read with a single read, and the parameters
+	// are then parsed from memory instead of with one read call per field. A section smaller than its fields
+	// is read past its end (as the Python reader does), so the buffer covers the fields of every section.
+	const std::streamoff app_offset = (std::streamoff)Sect1Size + Sect2Size;
+	const std::streamoff proc_offset = app_offset + Sect3Size;
+	const std::streamoff header_size = std::max(std::max(data_offset, (std::streamoff)RIDAT_ID_SECTION_SIZE),
+		std::max(std::max((std::streamoff)Sect1Size + RIDAT_SYS_SECTION_SIZE, app_offset + RIDAT_APP_SECTION_SIZE),
+			proc_offset + RIDAT_PROC_SECTION_SIZE));
+	string header_bytes((size_t)header_size, '\0');
+	ridat_file.seekg(0);
+	if (header_size > file_size || !ridat_file.read(&header_bytes[0], header_size))
+	{
+		cout << "The file ended inside its header sections. File is corrupted." << endl;
+		return -4;
+	}
+	std::istringstream header(header_bytes);
+	header.seekg(6 * 4);
 
-	acq_data.title = read_string_from_binary_file(ridat_file, 128);
+	acq_data.title = read_string_from_binary_file(header, 128);
 
-	const int IdEndMark = read_int_from_binary_file(ridat_file);
+	const int IdEndMark = read_int_from_binary_file(header);
 
 
 	////////////////////////////////////////////////////////////////////////////////////////////////////////
 	////////////////////////////////////////////////////////////////////////////////////// System Parameters
-	ridat_file.seekg(Sect1Size);
-
-	acq_data.sys_params.Dead1 = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.Dead2 = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.P90 = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.P180 = read_float_from_binary_file(ridat_file);
-
-	acq_data.sys_params.rf_channel_0.SF = read_double_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_0.Offset = read_double_from_binary_file(ridat_file);
-	const int Dummy1 = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_0.MultReg = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_0.PhaseTwiddle = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_0.ChanAOffset = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_0.ChanBOffset = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_0.ExtAPhaseTrim = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_0.ExtAAmpTrim = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_0.ExtBPhaseTrim = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_0.ExtBAmpTrim = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_0.IntAAmpTrim = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_0.IntBAmpTrim = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_0.PhaseTrim0 = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_0.AmpTrim0 = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_0.PhaseTrim90 = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_0.AmpTrim90 = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_0.PhaseTrim180 = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_0.AmpTrim180 = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_0.PhaseTrim270 = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_0.AmpTrim270 = read_int_from_binary_file(ridat_file);
-
-	acq_data.sys_params.rf_channel_1.SF = read_double_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_1.Offset = read_double_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_1.MultReg = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_1.PhaseTwiddle = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_1.ChanAOffset = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_1.ChanBOffset = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_1.ExtAPhaseTrim = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_1.ExtAAmpTrim = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_1.ExtBPhaseTrim = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_1.ExtBAmpTrim = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_1.IntAAmpTrim = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_1.IntBAmpTrim = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_1.PhaseTrim0 = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_1.AmpTrim0 = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_1.PhaseTrim90 = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_1.AmpTrim90 = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_1.PhaseTrim180 = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_1.AmpTrim180 = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_1.PhaseTrim270 = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_1.AmpTrim270 = read_int_from_binary_file(ridat_file);
-
-	acq_data.sys_params.rf_channel_2.SF = read_double_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_2.Offset = read_double_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_2.MultReg = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_2.PhaseTwiddle = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_2.ChanAOffset = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_2.ChanBOffset = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_2.ExtAPhaseTrim = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_2.ExtAAmpTrim = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_2.ExtBPhaseTrim = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_2.ExtBAmpTrim = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_2.IntAAmpTrim = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_2.IntBAmpTrim = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_2.PhaseTrim0 = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_2.AmpTrim0 = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_2.PhaseTrim90 = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_2.AmpTrim90 = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_2.PhaseTrim180 = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_2.AmpTrim180 = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_2.PhaseTrim270 = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_2.AmpTrim270 = read_int_from_binary_file(ridat_file);
-
-	acq_data.sys_params.rf_channel_0.quadtrim = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_1.quadtrim = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.rf_channel_2.quadtrim = read_int_from_binary_file(ridat_file);
-
-	acq_data.sys_params.GSH1 = read_string_from_binary_file(ridat_file, 20);
-	acq_data.sys_params.GSH2 = read_string_from_binary_file(ridat_file, 20);
-	acq_data.sys_params.GSH3 = read_string_from_binary_file(ridat_file, 20);
-	acq_data.sys_params.GSH4 = read_string_from_binary_file(ridat_file, 20);
-	acq_data.sys_params.GSH5 = read_string_from_binary_file(ridat_file, 20);
-
-	acq_data.sys_params.EndTime = read_double_from_binary_file(ridat_file);
-
-	acq_data.sys_params.PreXK[0] = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.PreXA[0] = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.PreXK[1] = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.PreXA[1] = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.PreXK[2] = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.PreXA[2] = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.PreXK[3] = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.PreXA[3] = read_float_from_binary_file(ridat_file);
-
-	acq_data.sys_params.PreYK[0] = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.PreYA[0] = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.PreYK[1] = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.PreYA[1] = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.PreYK[2] = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.PreYA[2] = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.PreYK[3] = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.PreYA[3] = read_float_from_binary_file(ridat_file);
-
-	acq_data.sys_params.PreZK[0] = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.PreZA[0] = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.PreZK[1] = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.PreZA[1] = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.PreZK[2] = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.PreZA[2] = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.PreZK[3] = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.PreZA[3] = read_float_from_binary_file(ridat_file);
-
-	acq_data.sys_params.XB0K = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.XB0A = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.YB0K = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.YB0A = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.ZB0K = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.ZB0A = read_float_from_binary_file(ridat_file);
-
-	acq_data.sys_params.DummyPar1 = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.DummyPar1 = read_float_from_binary_file(ridat_file);
-
-	acq_data.sys_params.Dec90 = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.CPD = read_string_from_binary_file(ridat_file, 20);
-	acq_data.sys_params.Trigger = read_int_from_binary_file(ridat_file);
-	acq_data.sys_params.XB0 = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.YB0 = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.ZB0 = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.XOffset = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.YOffset = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.ZOffset = read_float_from_binary_file(ridat_file);
-	acq_data.sys_params.Acquisition = read_int_from_binary_file(ridat_file);
-
-	const int SysEndMark = read_int_from_binary_file(ridat_file);
+	header.seekg(Sect1Size);
+
+	acq_data.sys_params.Dead1 = read_float_from_binary_file(header);
+	acq_data.sys_params.Dead2 = read_float_from_binary_file(header);
+	acq_data.sys_params.P90 = read_float_from_binary_file(header);
+	acq_data.sys_params.P180 = read_float_from_binary_file(header);
+
+	acq_data.sys_params.rf_channel_0.SF = read_double_from_binary_file(header);
+	acq_data.sys_params.rf_channel_0.Offset = read_double_from_binary_file(header);
+	const int Dummy1 = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_0.MultReg = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_0.PhaseTwiddle = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_0.ChanAOffset = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_0.ChanBOffset = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_0.ExtAPhaseTrim = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_0.ExtAAmpTrim = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_0.ExtBPhaseTrim = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_0.ExtBAmpTrim = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_0.IntAAmpTrim = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_0.IntBAmpTrim = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_0.PhaseTrim0 = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_0.AmpTrim0 = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_0.PhaseTrim90 = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_0.AmpTrim90 = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_0.PhaseTrim180 = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_0.AmpTrim180 = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_0.PhaseTrim270 = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_0.AmpTrim270 = read_int_from_binary_file(header);
+
+	acq_data.sys_params.rf_channel_1.SF = read_double_from_binary_file(header);
+	acq_data.sys_params.rf_channel_1.Offset = read_double_from_binary_file(header);
+	acq_data.sys_params.rf_channel_1.MultReg = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_1.PhaseTwiddle = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_1.ChanAOffset = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_1.ChanBOffset = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_1.ExtAPhaseTrim = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_1.ExtAAmpTrim = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_1.ExtBPhaseTrim = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_1.ExtBAmpTrim = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_1.IntAAmpTrim = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_1.IntBAmpTrim = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_1.PhaseTrim0 = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_1.AmpTrim0 = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_1.PhaseTrim90 = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_1.AmpTrim90 = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_1.PhaseTrim180 = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_1.AmpTrim180 = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_1.PhaseTrim270 = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_1.AmpTrim270 = read_int_from_binary_file(header);
+
+	acq_data.sys_params.rf_channel_2.SF = read_double_from_binary_file(header);
+	acq_data.sys_params.rf_channel_2.Offset = read_double_from_binary_file(header);
+	acq_data.sys_params.rf_channel_2.MultReg = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_2.PhaseTwiddle = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_2.ChanAOffset = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_2.ChanBOffset = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_2.ExtAPhaseTrim = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_2.ExtAAmpTrim = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_2.ExtBPhaseTrim = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_2.ExtBAmpTrim = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_2.IntAAmpTrim = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_2.IntBAmpTrim = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_2.PhaseTrim0 = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_2.AmpTrim0 = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_2.PhaseTrim90 = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_2.AmpTrim90 = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_2.PhaseTrim180 = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_2.AmpTrim180 = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_2.PhaseTrim270 = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_2.AmpTrim270 = read_int_from_binary_file(header);
+
+	acq_data.sys_params.rf_channel_0.quadtrim = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_1.quadtrim = read_int_from_binary_file(header);
+	acq_data.sys_params.rf_channel_2.quadtrim = read_int_from_binary_file(header);
+
+	acq_data.sys_params.GSH1 = read_string_from_binary_file(header, 20);
+	acq_data.sys_params.GSH2 = read_string_from_binary_file(header, 20);
+	acq_data.sys_params.GSH3 = read_string_from_binary_file(header, 20);
+	acq_data.sys_params.GSH4 = read_string_from_binary_file(header, 20);
+	acq_data.sys_params.GSH5 = read_string_from_binary_file(header, 20);
+
+	acq_data.sys_params.EndTime = read_double_from_binary_file(header);
+
+	acq_data.sys_params.PreXK[0] = read_float_from_binary_file(header);
+	acq_data.sys_params.PreXA[0] = read_float_from_binary_file(header);
+	acq_data.sys_params.PreXK[1] = read_float_from_binary_file(header);
+	acq_data.sys_params.PreXA[1] = read_float_from_binary_file(header);
+	acq_data.sys_params.PreXK[2] = read_float_from_binary_file(header);
+	acq_data.sys_params.PreXA[2] = read_float_from_binary_file(header);
+	acq_data.sys_params.PreXK[3] = read_float_from_binary_file(header);
+	acq_data.sys_params.PreXA[3] = read_float_from_binary_file(header);
+
+	acq_data.sys_params.PreYK[0] = read_float_from_binary_file(header);
+	acq_data.sys_params.PreYA[0] = read_float_from_binary_file(header);
+	acq_data.sys_params.PreYK[1] = read_float_from_binary_file(header);
+	acq_data.sys_params.PreYA[1] = read_float_from_binary_file(header);
+	acq_data.sys_params.PreYK[2] = read_float_from_binary_file(header);
+	acq_data.sys_params.PreYA[2] = read_float_from_binary_file(header);
+	acq_data.sys_params.PreYK[3] = read_float_from_binary_file(header);
+	acq_data.sys_params.PreYA[3] = read_float_from_binary_file(header);
+
+	acq_data.sys_params.PreZK[0] = read_float_from_binary_file(header);
+	acq_data.sys_params.PreZA[0] = read_float_from_binary_file(header);
+	acq_data.sys_params.PreZK[1] = read_float_from_binary_file(header);
+	acq_data.sys_params.PreZA[1] = read_float_from_binary_file(header);
+	acq_data.sys_params.PreZK[2] = read_float_from_binary_file(header);
+	acq_data.sys_params.PreZA[2] = read_float_from_binary_file(header);
+	acq_data.sys_params.PreZK[3] = read_float_from_binary_file(header);
+	acq_data.sys_params.PreZA[3] = read_float_from_binary_file(header);
+
+	acq_data.sys_params.XB0K = read_float_from_binary_file(header);
+	acq_data.sys_params.XB0A = read_float_from_binary_file(header);
+	acq_data.sys_params.YB0K = read_float_from_binary_file(header);
+	acq_data.sys_params.YB0A = read_float_from_binary_file(header);
+	acq_data.sys_params.ZB0K = read_float_from_binary_file(header);
+	acq_data.sys_params.ZB0A = read_float_from_binary_file(header);
+
+	acq_data.sys_params.DummyPar1 = read_float_from_binary_file(header);
+	acq_data.sys_params.DummyPar1 = read_float_from_binary_file(header);
+
+	acq_data.sys_params.Dec90 = read_float_from_binary_file(header);
+	acq_data.sys_params.CPD = read_string_from_binary_file(header, 20);
+	acq_data.sys_params.Trigger = read_int_from_binary_file(header);
+	acq_data.sys_params.XB0 = read_float_from_binary_file(header);
+	acq_data.sys_params.YB0 = read_float_from_binary_file(header);
+	acq_data.sys_params.ZB0 = read_float_from_binary_file(header);
+	acq_data.sys_params.XOffset = read_float_from_binary_file(header);
+	acq_data.sys_params.YOffset = read_float_from_binary_file(header);
+	acq_data.sys_params.ZOffset = read_float_from_binary_file(header);
+	acq_data.sys_params.Acquisition = read_int_from_binary_file(header);
+
+	const int SysEndMark = read_int_from_binary_file(header);
 
 	////////////////////////////////////////////////////////////////////////////////////////////////////////
 	///////////////////////////////////////////////////////////////////////////////// Application Parameters
-	ridat_file.seekg(Sect1Size + Sect2Size);
-
-	acq_data.app_params.SI = read_int_from_binary_file(ridat_file);
-	acq_data.app_params.DW = read_float_from_binary_file(ridat_file);
-	read_data_from_binary_file_to_array(ridat_file, acq_data.app_params.Pulses.data(), 5);
-	acq_data.app_params.RD = read_float_from_binary_file(ridat_file);
-	acq_data.app_params.tau = read_float_from_binary_file(ridat_file);
-	read_data_from_binary_file_to_array(ridat_file, acq_data.app_params.Delays.data(), 5);
-	acq_data.app_params.NS = read_int_from_binary_file(ridat_file);
-	acq_data.app_params.FW = read_float_from_binary_file(ridat_file);
-	acq_data.app_params.PH1 = read_string_from_binary_file(ridat_file, 132);
-	acq_data.app_params.PH2 = read_string_from_binary_file(ridat_file, 132);
-	acq_data.app_params.PH3 = read_string_from_binary_file(ridat_file, 132);
-	acq_data.app_params.PH4 = read_string_from_binary_file(ridat_file, 132);
-	acq_data.app_params.PH5 = read_string_from_binary_file(ridat_file, 132);
-	acq_data.app_params.RG = read_float_from_binary_file(ridat_file);
-	acq_data.app_params.NECH = read_int_from_binary_file(ridat_file);
-	acq_data.app_params.SW = read_double_from_binary_file(ridat_file);
-	acq_data.app_params.DB = read_int_from_binary_file(ridat_file);
-	acq_data.app_params.Bessel = read_double_from_binary_file(ridat_file);
-	acq_data.app_params.Butterworth = read_double_from_binary_file(ridat_file);
-	acq_data.app_params.SequenceName = read_string_from_binary_file(ridat_file, 32);
-	read_data_from_binary_file_to_array(ridat_file, acq_data.app_params.RfAmps_ch0.data(), 6);
-	read_data_from_binary_file_to_array(ridat_file, acq_data.app_params.RfAmps_ch1.data(), 6);
-	acq_data.app_params.WW = read_float_from_binary_file(ridat_file);
-	read_data_from_binary_file_to_array(ridat_file, acq_data.app_params.Counters.data(), 5);
-	acq_data.app_params.GRead = read_int_from_binary_file(ridat_file);
-	acq_data.app_params.GPhase = read_int_from_binary_file(ridat_file);
-	acq_data.app_params.GSlice = read_int_from_binary_file(ridat_file);
-	read_data_from_binary_file_to_array(ridat_file, acq_data.app_params.Gradients.data(), 9);
-	acq_data.app_params.MAC1 = read_float_from_binary_file(ridat_file);
-	acq_data.app_params.MAC2 = read_float_from_binary_file(ridat_file);
-	acq_data.app_params.SH1 = read_string_from_binary_file(ridat_file, 20);
-	acq_data.app_params.SH2 = read_string_from_binary_file(ridat_file, 20);
-	acq_data.app_params.SH3 = read_string_from_binary_file(ridat_file, 20);
-	acq_data.app_params.SH4 = read_string_from_binary_file(ridat_file, 20);
-	acq_data.app_params.SH5 = read_string_from_binary_file(ridat_file, 20);
-	acq_data.app_params.DS = read_int_from_binary_file(ridat_file);
-	acq_data.app_params.NA = read_int_from_binary_file(ridat_file);
-	read_data_from_binary_file_to_array(ridat_file, acq_data.app_params.GradientIncrements.data(), 9);
-	acq_data.app_params.DimX = read_int_from_binary_file(ridat_file);
-	acq_data.app_params.DimY = read_int_from_binary_file(ridat_file);
-	acq_data.app_params.DimZ = read_int_from_binary_file(ridat_file);
-	acq_data.app_params.DimC = read_int_from_binary_file(ridat_file);
-	acq_data.app_params.ImageEchos = read_int_from_binary_file(ridat_file);
-	acq_data.app_params.ImageSlices = read_int_from_binary_file(ridat_file);
-	read_data_from_binary_file_to_array(ridat_file, acq_data.app_params.Delays.data() + 5, 7);
-	acq_data.app_params.GradPhase = read_string_from_binary_file(ridat_file, 4);
-	acq_data.app_params.GradSlice = read_string_from_binary_file(ridat_file, 4);
-	acq_data.app_params.GradRead = read_string_from_binary_file(ridat_file, 4);
-	acq_data.app_params.TimePoints = read_int_from_binary_file(ridat_file);
-	acq_data.app_params.SNR = read_int_from_binary_file(ridat_file);
-	read_data_from_binary_file_to_array(ridat_file, acq_data.app_params.Counters.data() + 5, 7);
-	read_data_from_binary_file_to_array(ridat_file, acq_data.app_params.FPs.data(), 5);
-	acq_data.app_params.GREADX = read_float_from_binary_file(ridat_file);
-	acq_data.app_params.GREADY = read_float_from_binary_file(ridat_file);
-	acq_data.app_params.GREADZ = read_float_from_binary_file(ridat_file);
-	acq_data.app_params.GPHASEX = read_float_from_binary_file(ridat_file);
-	acq_data.app_params.GPHASEY = read_float_from_binary_file(ridat_file);
-	acq_data.app_params.GPHASEZ = read_float_from_binary_file(ridat_file);
-	acq_data.app_params.GSLICEX = read_float_from_binary_file(ridat_file);
-	acq_data.app_params.GSLICEY = read_float_from_binary_file(ridat_file);
-	acq_data.app_params.GSLICEZ = read_float_from_binary_file(ridat_file);
-	read_data_from_binary_file_to_array(ridat_file, acq_data.app_params.Delays.data() + 12, 20);
-	read_data_from_binary_file_to_array(ridat_file, acq_data.app_params.Counters.data() + 12, 20);
-	read_data_from_binary_file_to_array(ridat_file, acq_data.app_params.Gradients.data() + 9, 23);
-	read_data_from_binary_file_to_array(ridat_file, acq_data.app_params.MoreGains->data(), 9);
-	const int AppEndMark = read_int_from_binary_file(ridat_file);
+	header.seekg(app_offset);
+
+	acq_data.app_params.SI = read_int_from_binary_file(header);
+	acq_data.app_params.DW = read_float_from_binary_file(header);
+	read_data_from_binary_file_to_array(header, acq_data.app_params.Pulses.data(), 5);
+	acq_data.app_params.RD = read_float_from_binary_file(header);
+	acq_data.app_params.tau = read_float_from_binary_file(header);
+	read_data_from_binary_file_to_array(header, acq_data.app_params.Delays.data(), 5);
+	acq_data.app_params.NS = read_int_from_binary_file(header);
+	acq_data.app_params.FW = read_float_from_binary_file(header);
+	acq_data.app_params.PH1 = read_string_from_binary_file(header, 132);
+	acq_data.app_params.PH2 = read_string_from_binary_file(header, 132);
+	acq_data.app_params.PH3 = read_string_from_binary_file(header, 132);
+	acq_data.app_params.PH4 = read_string_from_binary_file(header, 132);
+	acq_data.app_params.PH5 = read_string_from_binary_file(header, 132);
+	acq_data.app_params.RG = read_float_from_binary_file(header);
+	acq_data.app_params.NECH = read_int_from_binary_file(header);
+	acq_data.app_params.SW = read_double_from_binary_file(header);
+	acq_data.app_params.DB = read_int_from_binary_file(header);
+	acq_data.app_params.Bessel = read_double_from_binary_file(header);
+	acq_data.app_params.Butterworth = read_double_from_binary_file(header);
+	acq_data.app_params.SequenceName = read_string_from_binary_file(header, 32);
+	read_data_from_binary_file_to_array(header, acq_data.app_params.RfAmps_ch0.data(), 6);
+	read_data_from_binary_file_to_array(header, acq_data.app_params.RfAmps_ch1.data(), 6);
+	acq_data.app_params.WW = read_float_from_binary_file(header);
+	read_data_from_binary_file_to_array(header, acq_data.app_params.Counters.data(), 5);
+	acq_data.app_params.GRead = read_int_from_binary_file(header);
+	acq_data.app_params.GPhase = read_int_from_binary_file(header);
+	acq_data.app_params.GSlice = read_int_from_binary_file(header);
+	read_data_from_binary_file_to_array(header, acq_data.app_params.Gradients.data(), 9);
+	acq_data.app_params.MAC1 = read_float_from_binary_file(header);
+	acq_data.app_params.MAC2 = read_float_from_binary_file(header);
+	acq_data.app_params.SH1 = read_string_from_binary_file(header, 20);
+	acq_data.app_params.SH2 = read_string_from_binary_file(header, 20);
+	acq_data.app_params.SH3 = read_string_from_binary_file(header, 20);
+	acq_data.app_params.SH4 = read_string_from_binary_file(header, 20);
+	acq_data.app_params.SH5 = read_string_from_binary_file(header, 20);
+	acq_data.app_params.DS = read_int_from_binary_file(header);
+	acq_data.app_params.NA = read_int_from_binary_file(header);
+	read_data_from_binary_file_to_array(header, acq_data.app_params.GradientIncrements.data(), 9);
+	acq_data.app_params.DimX = read_int_from_binary_file(header);
+	acq_data.app_params.DimY = read_int_from_binary_file(header);
+	acq_data.app_params.DimZ = read_int_from_binary_file(header);
+	acq_data.app_params.DimC = read_int_from_binary_file(header);
+	acq_data.app_params.ImageEchos = read_int_from_binary_file(header);
+	acq_data.app_params.ImageSlices = read_int_from_binary_file(header);
+	read_data_from_binary_file_to_array(header, acq_data.app_params.Delays.data() + 5, 7);
+	acq_data.app_params.GradPhase = read_string_from_binary_file(header, 4);
+	acq_data.app_params.GradSlice = read_string_from_binary_file(header, 4);
+	acq_data.app_params.GradRead = read_string_from_binary_file(header, 4);
+	acq_data.app_params.TimePoints = read_int_from_binary_file(header);
+	acq_data.app_params.SNR = read_int_from_binary_file(header);
+	read_data_from_binary_file_to_array(header, acq_data.app_params.Counters.data() + 5, 7);
+	read_data_from_binary_file_to_array(header, acq_data.app_params.FPs.data(), 5);
+	acq_data.app_params.GREADX = read_float_from_binary_file(header);
+	acq_data.app_params.GREADY = read_float_from_binary_file(header);
+	acq_data.app_params.GREADZ = read_float_from_binary_file(header);
+	acq_data.app_params.GPHASEX = read_float_from_binary_file(header);
+	acq_data.app_params.GPHASEY = read_float_from_binary_file(header);
+	acq_data.app_params.GPHASEZ = read_float_from_binary_file(header);
+	acq_data.app_params.GSLICEX = read_float_from_binary_file(header);
+	acq_data.app_params.GSLICEY = read_float_from_binary_file(header);
+	acq_data.app_params.GSLICEZ = read_float_from_binary_file(header);
+	read_data_from_binary_file_to_array(header, acq_data.app_params.Delays.data() + 12, 20);
+	read_data_from_binary_file_to_array(header, acq_data.app_params.Counters.data() + 12, 20);
+	read_data_from_binary_file_to_array(header, acq_data.app_params.Gradients.data() + 9, 23);
+	read_data_from_binary_file_to_array(header, acq_data.app_params.MoreGains->data(), 9);
+	const int AppEndMark = read_int_from_binary_file(header);
 
 	////////////////////////////////////////////////////////////////////////////////////////////////////////
 	////////////////////////////////////////////////////////////////////////////////// Processing Parameters
-	ridat_file.seekg(Sect1Size + Sect2Size + Sect3Size);
-
-	acq_data.proc_params.ProcFlags = read_int_from_binary_file(ridat_file);
-	read_data_from_binary_file_to_array(ridat_file, acq_data.proc_params.ProcDummies.data(), 9);
-	acq_data.proc_params.LB = read_float_from_binary_file(ridat_file);
-	acq_data.proc_params.PA = read_float_from_binary_file(ridat_file);
-	acq_data.proc_params.PB = read_float_from_binary_file(ridat_file);
-	acq_data.proc_params.DP = read_float_from_binary_file(ridat_file);
-	acq_data.proc_params.SMP = read_int_from_binary_file(ridat_file);
-	acq_data.proc_params.PivotPoint = read_int_from_binary_file(ridat_file);
-	acq_data.proc_params.NOBC = read_int_from_binary_file(ridat_file);
-	acq_data.proc_params.PPRF = read_int_from_binary_file(ridat_file);
-	acq_data.proc_params.PPTH = read_double_from_binary_file(ridat_file);
-	acq_data.proc_params.PPBL = read_double_from_binary_file(ridat_file);
-	acq_data.proc_params.PPAF = read_int_from_binary_file(ridat_file);
-	acq_data.proc_params.INC2D = read_float_from_binary_file(ridat_file);
-	acq_data.proc_params.SD2D = read_double_from_binary_file(ridat_file);
-
-	const int ProcEndMark = read_int_from_binary_file(ridat_file);
+	header.seekg(proc_offset);
+
+	acq_data.proc_params.ProcFlags = read_int_from_binary_file(header);
+	read_data_from_binary_file_to_array(header, acq_data.proc_params.ProcDummies.data(), 9);
+	acq_data.proc_params.LB = read_float_from_binary_file(header);
+	acq_data.proc_params.PA = read_float_from_binary_file(header);
+	acq_data.proc_params.PB = read_float_from_binary_file(header);
+	acq_data.proc_params.DP = read_float_from_binary_file(header);
+	acq_data.proc_params.SMP = read_int_from_binary_file(header);
+	acq_data.proc_params.PivotPoint = read_int_from_binary_file(header);
+	acq_data.proc_params.NOBC = read_int_from_binary_file(header);
+	acq_data.proc_params.PPRF = read_int_from_binary_file(header);
+	acq_data.proc_params.PPTH = read_double_from_binary_file(header);
+	acq_data.proc_params.PPBL = read_double_from_binary_file(header);
+	acq_data.proc_params.PPAF = read_int_from_binary_file(header);
+	acq_data.proc_params.INC2D = read_float_from_binary_file(header);
+	acq_data.proc_params.SD2D = read_double_from_binary_file(header);
+
+	const int ProcEndMark = read_int_from_binary_file(header);
 
 	////////////////////////////////////////////////////////////////////////////////////////////////////////
 	///////////////////////////////////////////////////////////////////////////////////// Reading Decay Data
 
-	acq_data.time.clear();
-	acq_data.real_amplitude.clear();
-	acq_data.imag_amplitude.clear();
+	// the data section is read with a single read, into vectors sized from the length of the file. Each record
+	// has 16 bytes: real (float), imaginary (float) and time (double).
+	const std::streamoff data_size = file_size - data_offset;
+	if (data_size % RIDAT_RECORD_SIZE != 0)
+	{
+		cout << "The data section has a truncated record. File is corrupted." << endl;
+		return -5;
+	}
+	const size_t num_points = (size_t)(data_size / RIDAT_RECORD_SIZE);
+
+	vector<char> data_bytes((size_t)data_size);
+	ridat_file.seekg(data_offset);
+	if (num_points > 0 && !ridat_file.read(data_bytes.data(), data_size))
+	{
+		cout << "Could not read the data section of the file." << endl;
+		return -4;
+	}
 
-	ridat_file.seekg(Sect1Size + Sect2Size + Sect3Size + Sect4Size);
+	acq_data.time.resize(num_points);
+	acq_data.real_amplitude.resize(num_points);
+	acq_data.imag_amplitude.resize(num_points);
 
-	while (ridat_file.good())
+	const char* record = data_bytes.data();
+	for (size_t i = 0; i < num_points; i++, record += RIDAT_RECORD_SIZE)
 	{
-		acq_data.real_amplitude.push_back((double)read_float_from_binary_file(ridat_file));
-		acq_data.imag_amplitude.push_back((double)read_float_from_binary_file(ridat_file));
-		acq_data.time.push_back(read_double_from_binary_file(ridat_file));
+		float real_value, imag_value;
+		std::memcpy(&real_value, record, 4);
+		std::memcpy(&imag_value, record + 4, 4);
+		std::memcpy(&acq_data.time[i], record + 8, 8);
+		acq_data.real_amplitude[i] = (double)real_value;
+		acq_data.imag_amplitude[i] = (double)imag_value;
 	}
 	return 1;
 }
 
+
+///////////////////////////////////////////////////////////////////////////////////////////////////////////////////////////
+vector<int> readRiDatFiles(const vector<string>& file_paths, vector<RiDatAcqData>& acq_data, unsigned int n_threads)
+{
+	acq_data.resize(file_paths.size());
+	vector<int> status(file_paths.size(), 0);
+
+	if (n_threads == 0)
+	{
+		n_threads = std::max(1u, std::thread::hardware_concurrency());
+	}
+	n_threads = (unsigned int)std::min<size_t>(n_threads, file_paths.size());
+
+	// each thread takes the next file that was not read yet, until there are none left.
+	std::atomic<size_t> next_file(0);
+	auto read_next_files = [&]()
+	{
+		for (size_t i = next_file++; i < file_paths.size(); i = next_file++)
+		{
+			// an exception escaping a std::thread would terminate the whole process, so a file that can not be
+			// read (e.g. out of memory) only fails with -4.
+			try
+			{
+				status[i] = readRiDatFile(file_paths[i], acq_data[i]);
+			}
+			catch (const std::exception& error)
+			{
+				cout << "Could not read file at path " << file_paths[i] << ": " << error.what() << endl;
+				status[i] = -4;
+			}
+		}
+	};
+
+	vector<std::thread> threads;
+	for (unsigned int i = 1; i < n_threads; i++)
+	{
+		threads.emplace_back(read_next_files);
+	}
+	read_next_files();
+	for (auto& thread : threads)
+	{
+		thread.join();
+	}
+	return status;
+}
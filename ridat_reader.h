@@ -8,6 +8,8 @@ as input, and stores all data in a "RiDatAcqData" struct, which has:
 ....the imaginary component of the signal  (std::vector<double>)
 ....the acquisition parameters (structs with "System", "Application" and "Processing" parameters, and a title std::string)
 
+"readRiDatFiles" reads a list of files concurrently, with a pool of threads (link with -pthread).
+
 I didn't kept track of what all these parameters means, but it appears that most of them have the same name inside RINMR.
 
 This is a free software with a MIT License.
@@ -113,4 +115,8 @@ struct RiDatAcqData
 
 int readRiDatFile(string file_path, RiDatAcqData& acq_data);
 
+// Reads many files concurrently, with "n_threads" threads (0 uses all cores). "acq_data" is resized to one
+// RiDatAcqData per path, and the returned vector has the readRiDatFile return code of each file.
+vector<int> readRiDatFiles(const vector<string>& file_paths, vector<RiDatAcqData>& acq_data, unsigned int n_threads = 0);
+
 #endif // !RIDAT_READER_H
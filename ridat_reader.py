@@ -10,6 +10,24 @@ The main function is "read_ridat_file", which receives the file's path as input,
 
 Another function is "export_ridat_data_to_text_file", which opens a .RiDat file and export the time, real and imaginary
 arrays to a text file, with values separated by '\t' (default) or another delimiter defined by the yser.
+"export_ridat_data" does the same to binary formats (.npy, .npz, and Arrow/Parquet if pyarrow is installed), and can
+also save the parameters as JSON. Whole directory trees can be converted from the command line, with
+"python -m ridat_reader convert <source dir> <output dir>", which skips the files that did not change since the last run.
+"validate_ridat_file" checks the structure of a file from its header bytes alone, and "scan_ridat_archive" (or
+"python -m ridat_reader scan <root>") does it in parallel for a whole directory tree, reporting the bad files.
+
+When only the parameters are needed, "read_ridat_header" reads them without touching the data section, and
+"iter_ridat_chunks" goes through the data section in blocks of bounded size. "read_ridat_file" can also read only a
+range of points, a stride, a list of points or a time window, reading just the selected records from the file.
+For large files there is also the "RiDatFile" class, which memory-maps the file and exposes the real, imaginary and
+time data as views over the file's bytes, so nothing is copied until it is sliced. Whole series of files can be read
+in parallel with "read_ridat_files", which stacks them into 2D (files x points) arrays, and files that are still being
+written can be followed with "RiDatFollower", which only decodes the newly appended records. Services that read the
+same files over and over can keep them in a "RiDatCache". Synthetic files (e.g. for tests and benchmarks) can be
+written with "write_ridat_file". Uniformly sampled time values can be returned as a compact "RiDatTimeAxis"
+instead of a full array, with read_ridat_file(..., compact_time=True). To find out where the time of a slow read goes,
+pass a "RiDatStats" to "read_ridat_file" or "export_ridat_data_to_text_file", and it will record the time of each
+phase and the I/O done.
 
 The remaining functions are for reading the file's bytes into data types, while the classes only serve as a way to wrap
 all of the 70343196 zillion parameters inside these .RiDat files. These are divided in "System", "Application" and 
@@ -31,130 +49,309 @@ __maintainer__ = 'Pedro Vianna Mesquita'
 __email__ = 'pedroviannamesquita@gmail.com'
 __status__ = 'active'
 
+import argparse
+import bisect
+import collections
+import concurrent.futures
+import hashlib
+import json
+import mmap
+import os
 import struct
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
 import numpy as np
 
 
+# Layout of each record of the data section: real and imaginary amplitudes (float32) and time (float64).
+RIDAT_RECORD_DTYPE = np.dtype([('real', '<f4'), ('imag', '<f4'), ('time', '<f8')])
+
+
+# ###################################################################################################
+# ######################################################################################### FILE LAYOUT
+# Binary layout of each header section, in file order. Each entry is a (field name, struct code) pair:
+# ....codes with a count ("5f") are read as numpy arrays, and "Ns" codes as zero-padded strings of N bytes;
+# ....names that appear more than once are concatenated, in order, into a single array (e.g. "Delays");
+# ....names like "rf1.SF" belong to one of the three rf channels of the System parameters;
+# ....names starting with "_" are read, but not stored in the parameter classes (dummies and end marks).
+# Each layout is compiled into a single little-endian struct.Struct, so a section is decoded with one unpack.
+
+RIDAT_MAGIC_NUMBER = 190955
+
+_RF_CHANNEL_INT_FIELDS = ('MultReg', 'PhaseTwiddle', 'ChanAOffset', 'ChanBOffset', 'ExtAPhaseTrim', 'ExtAAmpTrim',
+                          'ExtBPhaseTrim', 'ExtBAmpTrim', 'IntAAmpTrim', 'IntBAmpTrim', 'PhaseTrim0', 'AmpTrim0',
+                          'PhaseTrim90', 'AmpTrim90', 'PhaseTrim180', 'AmpTrim180', 'PhaseTrim270', 'AmpTrim270')
+
+
+def _rf_channel_layout(channel):
+    prefix = 'rf%d.' % channel
+    layout = ((prefix + 'SF', 'd'), (prefix + 'Offset', 'd'))
+    if channel == 0:
+        layout += (('_Dummy1', 'i'),)
+    return layout + tuple((prefix + name, 'i') for name in _RF_CHANNEL_INT_FIELDS)
+
+
+# the pre-emphasis constants are stored as interleaved (K, A) pairs.
+def _pre_emphasis_layout(axis):
+    return tuple(entry for _ in range(4) for entry in (('Pre%sK' % axis, 'f'), ('Pre%sA' % axis, 'f')))
+
+
+_ID_LAYOUT = (
+    ('MagicNumber', 'i'), ('FileVersion', 'i'),
+    ('Sect1Size', 'i'), ('Sect2Size', 'i'), ('Sect3Size', 'i'), ('Sect4Size', 'i'),
+    ('Comment', '128s'), ('_IdEndMark', 'i'),
+)
+
+_SYS_LAYOUT = (
+    (('Dead1', 'f'), ('Dead2', 'f'), ('P90', 'f'), ('P180', 'f'))
+    + _rf_channel_layout(0) + _rf_channel_layout(1) + _rf_channel_layout(2)
+    + (('rf0.quadtrim', 'i'), ('rf1.quadtrim', 'i'), ('rf2.quadtrim', 'i'),
+       ('GSH1', '20s'), ('GSH2', '20s'), ('GSH3', '20s'), ('GSH4', '20s'), ('GSH5', '20s'),
+       ('EndTime', 'd'))
+    + _pre_emphasis_layout('X') + _pre_emphasis_layout('Y') + _pre_emphasis_layout('Z')
+    + (('XB0K', 'f'), ('XB0A', 'f'), ('YB0K', 'f'), ('YB0A', 'f'), ('ZB0K', 'f'), ('ZB0A', 'f'),
+       ('DummyPar1', 'f'), ('DummyPar2', 'f'),
+       ('Dec90', 'f'), ('CPD', '20s'), ('Trigger', 'i'),
+       ('XB0', 'f'), ('YB0', 'f'), ('ZB0', 'f'), ('XOffset', 'f'), ('YOffset', 'f'), ('ZOffset', 'f'),
+       ('Acquisition', 'i'),
+       ('_SysEndMark', 'i'))
+)
+
+_APP_LAYOUT = (
+    ('SI', 'i'), ('DW', 'f'), ('Pulses', '5f'), ('RD', 'f'), ('tau', 'f'), ('Delays', '5f'), ('NS', 'i'), ('FW', 'f'),
+    ('PH1', '132s'), ('PH2', '132s'), ('PH3', '132s'), ('PH4', '132s'), ('PH5', '132s'),
+    ('RG', 'f'), ('NECH', 'i'), ('SW', 'd'), ('DB', 'i'), ('Bessel', 'd'), ('Butterworth', 'd'),
+    ('SequenceName', '32s'), ('RfAmps_ch0', '6f'), ('RfAmps_ch1', '6f'), ('WW', 'f'), ('Counters', '5i'),
+    ('GRead', 'i'), ('GPhase', 'i'), ('GSlice', 'i'), ('Gradients', '9i'), ('MAC1', 'f'), ('MAC2', 'f'),
+    ('SH1', '20s'), ('SH2', '20s'), ('SH3', '20s'), ('SH4', '20s'), ('SH5', '20s'),
+    ('DS', 'i'), ('NA', 'i'), ('GradientsIncrements', '9i'),
+    ('DimX', 'i'), ('DimY', 'i'), ('DimZ', 'i'), ('DimC', 'i'), ('ImageEchos', 'i'), ('ImageSlices', 'i'),
+    ('Delays', '7f'), ('GradPhase', '4s'), ('GradSlice', '4s'), ('GradRead', '4s'), ('TimePoints', 'i'),
+    ('SNR', 'i'), ('Counters', '7i'), ('FPs', '5f'),
+    ('GREADX', 'f'), ('GREADY', 'f'), ('GREADZ', 'f'), ('GPHASEX', 'f'), ('GPHASEY', 'f'), ('GPHASEZ', 'f'),
+    ('GSLICEX', 'f'), ('GSLICEY', 'f'), ('GSLICEZ', 'f'),
+    ('Delays', '20f'), ('Counters', '20i'), ('Gradients', '23i'), ('MoreGains', '9f'),
+    ('_AppEndMark', 'i'),
+)
+
+_PROC_LAYOUT = (
+    ('ProcFlags', 'i'), ('ProcDummies', '9i'), ('LB', 'f'), ('PA', 'f'), ('PB', 'f'), ('DP', 'f'),
+    ('SMP', 'i'), ('PivotPoint', 'i'), ('NOBC', 'i'), ('PPRF', 'i'), ('PPTH', 'd'), ('PPBL', 'd'),
+    ('PPAF', 'i'), ('INC2D', 'f'), ('SD2D', 'd'),
+    ('_ProcEndMark', 'i'),
+)
+
+_STRUCT_CODE_DTYPES = {'i': np.int32, 'f': np.float32, 'd': np.float64}
+
+
+# A header layout compiled into a single struct.Struct. "unpack" decodes a whole section from a buffer into a
+# dictionary of field name -> value, with the same types the read_*_from_file functions return. Scalars of the
+# same type are converted together through one numpy array, which is much cheaper than one np.float32() per field.
+# "decode_field" decodes a single field, which is what the parameter classes use to decode their fields lazily.
+class _SectionLayout(object):
+    def __init__(self, entries):
+        self.entries = entries
+        self.struct = struct.Struct('<' + ''.join(code for _, code in entries))
+        self.size = self.struct.size
+
+        # for every field: its pieces, as (index of the first unpacked value, number of values, byte offset, code),
+        # its struct type ('i', 'f', 'd' or 's'), and whether it is an array.
+        self._pieces, self._types, self._arrays = {}, {}, set()
+        index, byte_offset = 0, 0
+        for name, code in entries:
+            count = 1 if code[-1] == 's' else int(code[:-1] or 1)
+            if name in self._pieces or count > 1:
+                self._arrays.add(name)
+            self._types.setdefault(name, code[-1])
+            self._pieces.setdefault(name, []).append((index, count, byte_offset, code))
+            index += count
+            byte_offset += struct.calcsize('<' + code)
+
+        self.fields = tuple(self._pieces)
+        scalars = [name for name in self.fields if name not in self._arrays]
+        self._scalars = {code: (tuple(name for name in scalars if self._types[name] == code),
+                                [self._pieces[name][0][0] for name in scalars if self._types[name] == code])
+                         for code in ('i', 'f', 'd', 's')}
+
+        # fields stored as attributes of the parameter classes, and fields stored in one of the rf channels.
+        self.attributes = tuple(name for name in self.fields if not name.startswith('_') and '.' not in name)
+        self.rf_fields = tuple((int(name[2]), name[4:], name) for name in self.fields if name.startswith('rf'))
+
+    def unpack(self, buffer, offset=0):
+        values = self.struct.unpack_from(buffer, offset)
+        fields = {}
+        for name in self._arrays:
+            data = [value for index, count, _, _ in self._pieces[name] for value in values[index:index + count]]
+            fields[name] = np.array(data, dtype=_STRUCT_CODE_DTYPES[self._types[name]])
+        names, value_indices = self._scalars['i']
+        fields.update(zip(names, [values[i] for i in value_indices]))
+        for code in ('f', 'd'):
+            names, value_indices = self._scalars[code]
+            fields.update(zip(names, np.array([values[i] for i in value_indices], dtype=_STRUCT_CODE_DTYPES[code])))
+        names, value_indices = self._scalars['s']
+        fields.update(zip(names, [str(values[i], "utf-8").rstrip('\x00') for i in value_indices]))
+        return fields
+
+    def decode_field(self, name, buffer, offset=0):
+        code = self._types[name]
+        if name in self._arrays:
+            dtype = np.dtype(_STRUCT_CODE_DTYPES[code]).newbyteorder('<')
+            pieces = [np.frombuffer(buffer, dtype, count, offset + byte_offset)
+                      for _, count, byte_offset, _ in self._pieces[name]]
+            return np.concatenate(pieces).astype(_STRUCT_CODE_DTYPES[code], copy=False)
+
+        _, _, byte_offset, full_code = self._pieces[name][0]
+        value = struct.unpack_from('<' + full_code, buffer, offset + byte_offset)[0]
+        if code == 'i':
+            return value
+        elif code == 's':
+            return str(value, "utf-8").rstrip('\x00')
+        return _STRUCT_CODE_DTYPES[code](value)
+
+    # encodes a section from a dictionary of field name -> value (arrays split over several entries are consumed
+    # in order, and strings are truncated or zero-padded to their size).
+    def pack(self, fields):
+        values, used = [], {}
+        for name, code in self.entries:
+            value = fields[name]
+            if name in self._arrays:
+                count = int(code[:-1] or 1)
+                start = used.get(name, 0)
+                piece = np.asarray(value).ravel()[start:start + count]
+                if piece.size != count:
+                    raise ValueError("The field %s has less than %d values." % (name, start + count))
+                values.extend(piece.astype(_STRUCT_CODE_DTYPES[code[-1]]).tolist())
+                used[name] = start + count
+            elif code[-1] == 's':
+                values.append(value.encode("utf-8"))
+            elif code[-1] == 'i':
+                values.append(int(value))
+            else:
+                values.append(float(value))
+        return self.struct.pack(*values)
+
+    # value of a field in parameter classes created from scratch (not read from a file).
+    def default_value(self, name):
+        code = self._types[name]
+        if name in self._arrays:
+            return np.zeros(sum(count for _, count, _, _ in self._pieces[name]), dtype=_STRUCT_CODE_DTYPES[code])
+        return {'i': 0, 'f': 0.0, 'd': 0.0, 's': ""}[code]
+
+
+_ID_SECTION = _SectionLayout(_ID_LAYOUT)
+_SYS_SECTION = _SectionLayout(_SYS_LAYOUT)
+_APP_SECTION = _SectionLayout(_APP_LAYOUT)
+_PROC_SECTION = _SectionLayout(_PROC_LAYOUT)
+
+
+# Base of the parameter classes. The instances only keep the bytes of the file's header ("buffer", with the section
+# starting at "offset"), and each field is decoded the first time it is accessed, then kept in its slot. Instances
+# created without a buffer start with zeros and empty strings. "to_dict" returns all fields, for bulk exports.
+class _LazyParameters(object):
+    __slots__ = ('_buffer', '_offset')
+    _section = None
+
+    def __init__(self, buffer=None, offset=0):
+        self._buffer = buffer
+        self._offset = offset
+
+    # only called for the fields that were not decoded (or assigned) yet.
+    def __getattr__(self, name):
+        if name.startswith('_') or name not in self.__slots__:
+            raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
+        value = self._decode(name)
+        setattr(self, name, value)
+        return value
+
+    def _decode(self, name):
+        if self._buffer is None:
+            return self._section.default_value(name)
+        return self._section.decode_field(name, self._buffer, self._offset)
+
+    # the fields that were not accessed yet are decoded all at once, and are not kept in the instance.
+    def to_dict(self):
+        fields, decoded = {}, None
+        for name in self._section.attributes:
+            try:
+                fields[name] = object.__getattribute__(self, name)
+            except AttributeError:
+                if decoded is None and self._buffer is not None:
+                    decoded = self._section.unpack(self._buffer, self._offset)
+                fields[name] = decoded[name] if decoded is not None else self._section.default_value(name)
+        return fields
+
+    # decodes all the fields that were not accessed yet at once, and keeps them in the instance.
+    def decode_all(self):
+        for name, value in _LazyParameters.to_dict(self).items():
+            setattr(self, name, value)
+
+
 # Class for storing Rf Channel parameters
 class RfChannelsParameters(object):
+    __slots__ = ('SF', 'Offset') + _RF_CHANNEL_INT_FIELDS + ('quadtrim',)
+
     def __init__(self):
         self.SF = 0.0
         self.Offset = 0.0
-        self.MultReg = 0
-        self.PhaseTwiddle = 0
-        self.ChanAOffset = 0
-        self.ChanBOffset = 0
-        self.ExtAPhaseTrim = 0
-        self.ExtAAmpTrim = 0
-        self.ExtBPhaseTrim = 0
-        self.ExtBAmpTrim = 0
-        self.IntAAmpTrim = 0
-        self.IntBAmpTrim = 0
-        self.PhaseTrim0 = 0
-        self.AmpTrim0 = 0
-        self.PhaseTrim90 = 0
-        self.AmpTrim90 = 0
-        self.PhaseTrim180 = 0
-        self.AmpTrim180 = 0
-        self.PhaseTrim270 = 0
-        self.AmpTrim270 = 0
+        for name in _RF_CHANNEL_INT_FIELDS:
+            setattr(self, name, 0)
         self.quadtrim = 0
 
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
 
-# Class for storing System parameters
-class SysParameters(object):
-    def __init__(self):
-        self.Dead1 = 0.0
-        self.Dead2 = 0.0
-        self.P90 = 0.0
-        self.P180 = 0.0
-        self.rf_channels = [RfChannelsParameters(), RfChannelsParameters(), RfChannelsParameters()]
-        self.GSH1, self.GSH2, self.GSH3, self.GSH4, self.GSH5 = "", "", "", "", ""
-        self.EndTime = 0.0
-        self.PreXK, self.PreXA = np.zeros(4, dtype=np.float64), np.zeros(4, dtype=np.float64)
-        self.PreYK, self.PreYA = np.zeros(4, dtype=np.float64), np.zeros(4, dtype=np.float64)
-        self.PreZK, self.PreZA = np.zeros(4, dtype=np.float64), np.zeros(4, dtype=np.float64)
-        self.XB0K, self.XB0A = 0.0, 0.0
-        self.YB0K, self.YB0A = 0.0, 0.0
-        self.ZB0K, self.ZB0A = 0.0, 0.0
-        self.DummyParam1, self.DummyParam2 = 0.0, 0.0
-        self.Dec90 = 0.0
-        self.CPD = ""
-        self.Trigger = 0
-        self.XB0, self.YB0, self.ZB0 = 0.0, 0.0, 0.0
-        self.XOffset, self.YOffset, self.ZOffset = 0.0, 0.0, 0.0
-        self.Acquisition = 0
+
+# Class for storing System parameters. "rf_channels" is a list with the parameters of the 3 rf channels.
+class SysParameters(_LazyParameters):
+    __slots__ = _SYS_SECTION.attributes + ('rf_channels',)
+    _section = _SYS_SECTION
+
+    def _decode(self, name):
+        if name != 'rf_channels':
+            return _LazyParameters._decode(self, name)
+        rf_channels = [RfChannelsParameters(), RfChannelsParameters(), RfChannelsParameters()]
+        if self._buffer is not None:
+            for channel, channel_name, name in self._section.rf_fields:
+                setattr(rf_channels[channel], channel_name, self._section.decode_field(name, self._buffer, self._offset))
+        return rf_channels
+
+    def to_dict(self):
+        fields = _LazyParameters.to_dict(self)
+        fields['rf_channels'] = [rf_channel.to_dict() for rf_channel in self.rf_channels]
+        return fields
+
+    def decode_all(self):
+        _LazyParameters.decode_all(self)
+        # accessing rf_channels decodes it and keeps it in its slot.
+        getattr(self, 'rf_channels')
 
 
 # Class for storing Application parameters
-class AppParameters(object):
-    def __init__(self):
-        self.SI = 0
-        self.DW = 0.0
-        self.Pulses = np.zeros(5, dtype=np.float64)
-        self.RD = 0.0    # Recycle Delay
-        self.tau = 0.0   # tau
-        self.Delays = np.zeros(32, dtype=np.float64)
-        self.NS = 0      # Number of Scans
-        self.FW = 0.0
-        self.PH1, self.PH2, self.PH3, self.PH4, self.PH5 = "", "", "", "", ""
-        self.RG = 0.0    # Receiver Gain
-        self.NECH = 0    # Number of Echos
-        self.SW = 0.0
-        self.DB = 0.0    # Attenuation ?
-        self.Bessel = 0.0
-        self.Butterworth = 0.0
-        self.SequenceName = ""
-        self.RfAmps_ch0 = np.zeros(6, dtype=np.float64)    # 6 rf amplitudes channel 0
-        self.RfAmps_ch1 = np.zeros(6, dtype=np.float64)    # 6 rf amplitudes channel 1
-        self.WW = 0.0     # WobbleWidth ?
-        self.Counters = np.zeros(32, dtype=np.int32)
-        self.GRead, self.GPhase, self.GSlice = 0, 0, 0   # GX, GY, GZ previously?
-        self.Gradients = np.zeros(32, dtype=np.int32)
-        self.MAC1, self.MAC2 = 0.0, 0.0
-        self.SH1, self.SH2, self.SH3, self.SH4, self.SH5 = "", "", "", "", ""
-        self.DS = 0
-        self.NA = 0
-        self.GradientsIncrements = np.zeros(9, dtype=np.int32)
-        self.DimX, self.DimY, self.DimZ, self.DimC = 0, 0, 0, 0
-        self.ImageEchos, self.ImageSlices = 0, 0
-        self.GradPhase, self.GradSlice, self. GradRead = "", "", ""
-        self.TimePoints = 0  # Points in Read direction for which time points are saved in .RiImage
-        self.SNR = 0  # signal to noise ratio?
-        self.FPs = np.zeros(5, dtype=np.float64)  # ??
-        self.GREADX, self.GREADY, self.GREADZ = 0.0, 0.0, 0.0
-        self.GPHASEX, self.GPHASEY, self.GPHASEZ = 0.0, 0.0, 0.0
-        self.GSLICEX, self.GSLICEY, self.GSLICEZ = 0.0, 0.0, 0.0
-        self.MoreGains = np.zeros(9, dtype=np.float64)
+class AppParameters(_LazyParameters):
+    __slots__ = _APP_SECTION.attributes
+    _section = _APP_SECTION
 
 
 # Class for storing Processing parameters
-class ProcessingParameters(object):
-    def __init__(self):
-        self.ProcFlags = 0
-        self.ProcDummies = None
-        self.LB = 0.0
-        self.PA = 0.0
-        self.PB = 0.0
-        self.DP = 0.0
-        self.SMP = 0
-        self.PivotPoint = 0
-        self.NOBC = 0
-        self.PPRF = 0
-        self.PPTH = 0.0
-        self.PPBL = 0.0
-        self.PPAF = 0
-        self.INC2D = 0.0
-        self.SD2D = 0.0
+class ProcessingParameters(_LazyParameters):
+    __slots__ = _PROC_SECTION.attributes
+    _section = _PROC_SECTION
 
 
 class AcquisitionParameters(object):
+    __slots__ = ('sys', 'app', 'proc', 'title')
+
     def __init__(self, sys, app, proc, comment):
         self.sys = sys
         self.app = app
         self.proc = proc
         self.title = comment
 
+    def to_dict(self):
+        return {'title': self.title, 'sys': self.sys.to_dict(), 'app': self.app.to_dict(), 'proc': self.proc.to_dict()}
+
 
 # reads 4 bytes from a file, and turn them into a Python integer.
 def read_int_from_file(read_file):
@@ -195,298 +392,1222 @@ def read_data_sequence_from_file(str_d_type, num_elements, read_file):
     return data
 
 
+# decodes the raw bytes of the data section into 3 np.float64 arrays (time, real and imaginary).
+# Each record has 16 bytes: a float32 real value, a float32 imaginary value and a float64 time value,
+# so the whole section is decoded at once through a structured dtype instead of sample by sample.
+def decode_data_section(data_bytes):
+    if len(data_bytes) % RIDAT_RECORD_DTYPE.itemsize:
+        raise IOError("The data section has a truncated record (%d trailing bytes). File is corrupted."
+                      % (len(data_bytes) % RIDAT_RECORD_DTYPE.itemsize))
+    return _decode_records(np.frombuffer(data_bytes, dtype=RIDAT_RECORD_DTYPE))
+
+
+def _decode_records(records):
+    time_values = records['time'].astype(np.float64)
+    real_values = records['real'].astype(np.float64)
+    imag_values = records['imag'].astype(np.float64)
+    return time_values, real_values, imag_values
+
+
+# reads and checks the identification header of an open .RiDat file. Returns its fields and the offsets (in bytes)
+# of the "System", "Application", "Processing" and data sections.
+def _read_id_section(ridat_file):
+    id_bytes = ridat_file.read(_ID_SECTION.size)
+    if len(id_bytes) < _ID_SECTION.size:
+        raise IOError("The file is too short to be a RiDat file.")
+    id_fields = _ID_SECTION.unpack(id_bytes)
+
+    # sanitity check for the file. If magic number is not 190955, this isn't a .RiImage or .RiDat file
+    if id_fields['MagicNumber'] != RIDAT_MAGIC_NUMBER:
+        raise IOError("The Magic number of the file is wrong. File is not a valid RiDat or is corrupted.")
+
+    # file version.
+    if id_fields['FileVersion'] == 1:
+        raise IOError("File is RiImage. Can not read it")
+    elif id_fields['FileVersion'] != 0:
+        raise IOError("Could not understand file version")
+
+    # Offsets of each section, from the sizes (number of bytes) of the sections before it.
+    for size_field in ('Sect2Size', 'Sect3Size', 'Sect4Size'):
+        if id_fields[size_field] < 0:
+            raise IOError("The size of a section (%s) is negative. File is corrupted." % size_field)
+    if id_fields['Sect1Size'] < _ID_SECTION.size:
+        raise IOError("The identification section (Sect1Size) is smaller than its %d bytes. File is corrupted."
+                      % _ID_SECTION.size)
+    sys_offset = id_fields['Sect1Size']
+    app_offset = sys_offset + id_fields['Sect2Size']
+    proc_offset = app_offset + id_fields['Sect3Size']
+    data_offset = proc_offset + id_fields['Sect4Size']
+    return id_fields, (sys_offset, app_offset, proc_offset, data_offset)
+
+
+# the three parameter sections are fetched with a single read, and each one is decoded with a single unpack.
+def _read_parameter_sections(ridat_file, sys_offset, app_offset, proc_offset):
+    header_end = max(sys_offset + _SYS_SECTION.size, app_offset + _APP_SECTION.size, proc_offset + _PROC_SECTION.size)
+    ridat_file.seek(sys_offset)
+    header_bytes = ridat_file.read(header_end - sys_offset)
+    if len(header_bytes) < header_end - sys_offset:
+        raise IOError("The file ended inside its parameter sections. File is corrupted.")
+    return header_bytes
+
+
+# reads the identification header and the "System", "Application" and "Processing" sections of an open
+# .RiDat file. Returns the acquisition parameters and the offset (in bytes) where the data section starts.
+# If a RiDatStats is given as "stats", the time of each step is recorded in it.
+def _read_ridat_header(ridat_file, stats=None):
+    start = time.perf_counter() if stats is not None else None
+    id_fields, (sys_offset, app_offset, proc_offset, data_offset) = _read_id_section(ridat_file)
+    if stats is not None:
+        start = stats.add_phase('id_header', start)
+    header_bytes = _read_parameter_sections(ridat_file, sys_offset, app_offset, proc_offset)
+    if stats is not None:
+        start = stats.add_phase('parameter_read', start)
+
+    # the parameters are only decoded from header_bytes when they are accessed. With stats, each section is decoded
+    # right away instead, so that its phase measures the actual decoding.
+    sys_params = SysParameters(header_bytes)
+    app_params = AppParameters(header_bytes, app_offset - sys_offset)
+    proc_params = ProcessingParameters(header_bytes, proc_offset - sys_offset)
+    if stats is not None:
+        sys_params.decode_all()
+        start = stats.add_phase('sys', start)
+        app_params.decode_all()
+        start = stats.add_phase('app', start)
+        proc_params.decode_all()
+        stats.add_phase('proc', start)
+
+    acquisition_parameters = AcquisitionParameters(sys_params, app_params, proc_params, id_fields['Comment'])
+    return acquisition_parameters, data_offset
+
+
+# returns the number of (real, imag, time) records in the data section of an open .RiDat file, from its size.
+def _count_data_records(ridat_file, data_offset):
+    data_size = os.fstat(ridat_file.fileno()).st_size - data_offset
+    if data_size < 0:
+        raise IOError("The file is shorter than its header sections. File is corrupted.")
+    if data_size % RIDAT_RECORD_DTYPE.itemsize:
+        raise IOError("The data section has a truncated record (%d trailing bytes). File is corrupted."
+                      % (data_size % RIDAT_RECORD_DTYPE.itemsize))
+    return data_size // RIDAT_RECORD_DTYPE.itemsize
+
+
 # This is the main thing. Receives the path of the .RiDat file, and returns
 # 3 numpy arrays (for the time values, and the amplitudes of the real and
 # imaginary channels), and a Class with all parameters, divided
 # as "System", "Application" and "Processing" parameters (sys, app, proc variables).
-def read_ridat_file(f_path):
+# If a RiDatStats is given as "stats", the time of each phase of the read and the I/O done are recorded in it.
+# With "compact_time", uniformly (or piecewise uniformly) sampled time values are returned as a RiDatTimeAxis
+# instead of a full array (see compact_time_axis).
+# Only part of the records can be read, like slicing the arrays: "start", "stop" and "step" select a range of points,
+# "time_window" = (first time, end time) selects the points with first time <= time < end time (either can be None),
+# and "indices" selects a list of points (or a boolean mask). Only the selected records are read from the file.
+def read_ridat_file(f_path, stats=None, compact_time=False, start=None, stop=None, step=None, indices=None,
+                    time_window=None):
+    if not (start is None and stop is None and step is None and indices is None and time_window is None):
+        time_values, real_values, imag_values, acquisition_parameters = _read_ridat_selection(
+            f_path, start, stop, step, indices, time_window, stats)
+    elif stats is not None:
+        time_values, real_values, imag_values, acquisition_parameters = _read_ridat_file_with_stats(f_path, stats)
+    else:
+        with open(f_path, 'rb') as ridat_file:
+            acquisition_parameters, data_offset = _read_ridat_header(ridat_file)
+            ridat_file.seek(data_offset)
+            time_values, real_values, imag_values = decode_data_section(ridat_file.read())
+    if compact_time:
+        time_values = compact_time_axis(time_values)
+    return time_values, real_values, imag_values, acquisition_parameters
+
+
+def _read_ridat_file_with_stats(f_path, stats):
+    start = time.perf_counter()
+    with _open_counting(f_path, stats) as ridat_file:
+        stats.add_phase('open', start)
+        acquisition_parameters, data_offset = _read_ridat_header(ridat_file, stats)
+        start = time.perf_counter()
+        ridat_file.seek(data_offset)
+        data_bytes = ridat_file.read()
+        start = stats.add_phase('data_read', start)
+        time_values, real_values, imag_values = decode_data_section(data_bytes)
+        stats.add_phase('data_decode', start)
+    stats.samples += time_values.size
+    stats.finish()
+    return time_values, real_values, imag_values, acquisition_parameters
+
+
+# reads the records selected by read_ridat_file's selection arguments. Contiguous ranges are read with a single
+# seek and read. Strided and indexed selections copy the records from a memory map of the file, so only the pages
+# holding selected records are read from disk. Time windows are found with a binary search over the time column of
+# the map, which must be in increasing order, so that only a few pages are touched to locate them.
+def _read_ridat_selection(f_path, start, stop, step, indices, time_window, stats):
+    begin = time.perf_counter()
+    with (open(f_path, 'rb') if stats is None else _open_counting(f_path, stats)) as ridat_file:
+        if stats is not None:
+            stats.add_phase('open', begin)
+        acquisition_parameters, data_offset = _read_ridat_header(ridat_file, stats)
+        num_points = _count_data_records(ridat_file, data_offset)
+        begin = time.perf_counter()
+        records = _read_selected_records(ridat_file, data_offset, num_points, start, stop, step, indices, time_window)
+        if stats is not None:
+            begin = stats.add_phase('data_read', begin)
+        time_values, real_values, imag_values = _decode_records(records)
+    if stats is not None:
+        stats.add_phase('data_decode', begin)
+        stats.samples += time_values.size
+        stats.finish()
+    return time_values, real_values, imag_values, acquisition_parameters
+
+
+def _read_selected_records(ridat_file, data_offset, num_points, start, stop, step, indices, time_window):
+    if indices is not None:
+        if not (start is None and stop is None and step is None and time_window is None):
+            raise ValueError("indices can not be combined with start, stop, step or time_window.")
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            if indices.shape != (num_points,):
+                raise ValueError("The boolean mask has %d values, but the file has %d points."
+                                 % (indices.size, num_points))
+            indices = np.flatnonzero(indices)
+        elif indices.size == 0:
+            indices = np.empty(0, dtype=np.int64)
+        indices = indices.astype(np.int64, casting='same_kind').ravel()
+        indices = np.where(indices < 0, indices + num_points, indices)
+        if indices.size and (indices.min() < 0 or indices.max() >= num_points):
+            raise IndexError("The indices are out of bounds for a file with %d points." % num_points)
+        return _map_records(ridat_file, data_offset, num_points, lambda records: records[indices])
+
+    if time_window is not None:
+        if not (start is None and stop is None):
+            raise ValueError("time_window can not be combined with start and stop.")
+        first_time, end_time = time_window
+        if first_time is not None or end_time is not None:
+            start, stop = _map_records(ridat_file, data_offset, num_points,
+                                       lambda records: _find_time_window(records['time'], first_time, end_time))
+
+    start, stop, step = slice(start, stop, step).indices(num_points)
+    if step != 1:
+        # a negative step ending before the first point gets stop == -1 from slice.indices, which means "up to
+        # the last point" when slicing again.
+        selection = slice(start, None if stop < 0 else stop, step)
+        return _map_records(ridat_file, data_offset, num_points, lambda records: records[selection].copy())
+
+    num_selected = max(stop - start, 0)
+    ridat_file.seek(data_offset + start * RIDAT_RECORD_DTYPE.itemsize)
+    data_bytes = ridat_file.read(num_selected * RIDAT_RECORD_DTYPE.itemsize)
+    if len(data_bytes) < num_selected * RIDAT_RECORD_DTYPE.itemsize:
+        raise IOError("The file got shorter while it was being read.")
+    return np.frombuffer(data_bytes, dtype=RIDAT_RECORD_DTYPE)
+
+
+# calls "select" with the records of the file viewed over a memory map, and returns its result, which must not keep
+# views over the map (it is closed before returning).
+def _map_records(ridat_file, data_offset, num_points, select):
+    if num_points == 0:
+        return select(np.empty(0, dtype=RIDAT_RECORD_DTYPE))
+    mapped = mmap.mmap(ridat_file.fileno(), 0, access=mmap.ACCESS_READ)
+    records = None
+    try:
+        records = np.frombuffer(mapped, dtype=RIDAT_RECORD_DTYPE, count=num_points, offset=data_offset)
+        return select(records)
+    finally:
+        records = None
+        try:
+            mapped.close()
+        except BufferError:
+            # a traceback still holds a view; the map is released with it.
+            pass
+
+
+# first and end positions of the times in [first_time, end_time), by binary search (bisect only reads the ~log2(N)
+# elements it compares, where np.searchsorted would first copy the whole strided column).
+def _find_time_window(time_column, first_time, end_time):
+    first = 0 if first_time is None else bisect.bisect_left(time_column, first_time)
+    end = len(time_column) if end_time is None else bisect.bisect_left(time_column, end_time, first)
+    return first, end
+
+
+# Reads only the acquisition parameters of a .RiDat file (title, "System", "Application" and "Processing"
+# parameters), stopping at the end of the Processing section. The data section is never read, so this costs
+# the same few kilobytes of I/O whatever the size of the acquisition.
+def read_ridat_header(f_path):
     with open(f_path, 'rb') as ridat_file:
+        acquisition_parameters, data_offset = _read_ridat_header(ridat_file)
+    return acquisition_parameters
+
+
+# Generator over the data section of a .RiDat file, in blocks of at most "chunk_points" records. Each block is a
+# (time, real, imag) tuple of np.float64 arrays, so long acquisitions can be processed with constant memory.
+def iter_ridat_chunks(f_path, chunk_points=65536):
+    if chunk_points < 1:
+        raise ValueError("chunk_points must be a positive number of points.")
+    return _iter_ridat_chunks(f_path, chunk_points)
+
+
+# The file is opened and its header read right away, so a missing or corrupted file raises here and not at the
+# first chunk; the returned generator closes the file once it is exhausted or discarded.
+# "stats" (a RiDatStats) is filled while the chunks are read, without calling its callback, so that the caller can
+# add its own phases before finishing it.
+def _iter_ridat_chunks(f_path, chunk_points, stats=None):
+    start = time.perf_counter() if stats is not None else None
+    ridat_file = open(f_path, 'rb') if stats is None else _open_counting(f_path, stats)
+    try:
+        if stats is not None:
+            stats.add_phase('open', start)
+        _, data_offset = _read_ridat_header(ridat_file, stats)
+        num_points = _count_data_records(ridat_file, data_offset)
+    except BaseException:
+        ridat_file.close()
+        raise
+    return _iter_closing_ridat_chunks(ridat_file, data_offset, num_points, chunk_points, stats)
+
+
+def _iter_closing_ridat_chunks(ridat_file, data_offset, num_points, chunk_points, stats):
+    with ridat_file:
+        for chunk in _iter_open_ridat_chunks(ridat_file, data_offset, num_points, chunk_points, stats):
+            yield chunk
+
+
+# the chunks of the data section of an already open file, whose header was already read.
+def _iter_open_ridat_chunks(ridat_file, data_offset, num_points, chunk_points, stats=None):
+    ridat_file.seek(data_offset)
+    for first_point in range(0, num_points, chunk_points):
+        start = time.perf_counter() if stats is not None else None
+        chunk_size = min(chunk_points, num_points - first_point) * RIDAT_RECORD_DTYPE.itemsize
+        data_bytes = ridat_file.read(chunk_size)
+        if len(data_bytes) < chunk_size:
+            raise IOError("The file %s got shorter while it was being read." % ridat_file.name)
+        if stats is None:
+            yield decode_data_section(data_bytes)
+            continue
+        start = stats.add_phase('data_read', start)
+        chunk = decode_data_section(data_bytes)
+        stats.add_phase('data_decode', start)
+        stats.samples += chunk[0].size
+        yield chunk
+
 
-        # sanitity check for the file. If magic number is not 190955, this isn't a .RiImage or .RiDat file
-        magic_number = read_int_from_file(ridat_file)
-        if magic_number != 190955:
-            raise IOError("The Magic number of the file is wrong. File is not a valid RiDat or is corrupted.")
-
-        # file version.
-        file_version = read_int_from_file(ridat_file)
-        if file_version == 1:
-            raise IOError("File is RiImage. Can not read it")
-        elif file_version != 0:
-            raise IOError("Could not understand file version")
-
-        # Sizes (number of bytes) for each data section of the file.
-        Sect1Size = read_int_from_file(ridat_file)
-        Sect2Size = read_int_from_file(ridat_file)
-        Sect3Size = read_int_from_file(ridat_file)
-        Sect4Size = read_int_from_file(ridat_file)
-        Comment = read_string_from_file(ridat_file, 128)
-
-        IdEndMark = read_int_from_file(ridat_file)
-
-        # ######################################################################################################
-        # #################################################################################### SYSTEM PARAMETERS
-        ridat_file.seek(Sect1Size)
-        sys_params = SysParameters()
-
-        sys_params.Dead1 = read_float_from_file(ridat_file)
-        sys_params.Dead2 = read_float_from_file(ridat_file)
-        sys_params.P90 = read_float_from_file(ridat_file)
-        sys_params.P180 = read_float_from_file(ridat_file)
-
-        sys_params.rf_channels[0].SF = read_double_from_file(ridat_file)
-        sys_params.rf_channels[0].Offset = read_double_from_file(ridat_file)
-        Dummy1 = read_int_from_file(ridat_file)
-        sys_params.rf_channels[0].MultReg = read_int_from_file(ridat_file)
-        sys_params.rf_channels[0].PhaseTwiddle = read_int_from_file(ridat_file)
-        sys_params.rf_channels[0].ChanAOffset = read_int_from_file(ridat_file)
-        sys_params.rf_channels[0].ChanBOffset = read_int_from_file(ridat_file)
-        sys_params.rf_channels[0].ExtAPhaseTrim = read_int_from_file(ridat_file)
-        sys_params.rf_channels[0].ExtAAmpTrim = read_int_from_file(ridat_file)
-        sys_params.rf_channels[0].ExtBPhaseTrim = read_int_from_file(ridat_file)
-        sys_params.rf_channels[0].ExtBAmpTrim = read_int_from_file(ridat_file)
-        sys_params.rf_channels[0].IntAAmpTrim = read_int_from_file(ridat_file)
-        sys_params.rf_channels[0].IntBAmpTrim = read_int_from_file(ridat_file)
-        sys_params.rf_channels[0].PhaseTrim0 = read_int_from_file(ridat_file)
-        sys_params.rf_channels[0].AmpTrim0 = read_int_from_file(ridat_file)
-        sys_params.rf_channels[0].PhaseTrim90 = read_int_from_file(ridat_file)
-        sys_params.rf_channels[0].AmpTrim90 = read_int_from_file(ridat_file)
-        sys_params.rf_channels[0].PhaseTrim180 = read_int_from_file(ridat_file)
-        sys_params.rf_channels[0].AmpTrim180 = read_int_from_file(ridat_file)
-        sys_params.rf_channels[0].PhaseTrim270 = read_int_from_file(ridat_file)
-        sys_params.rf_channels[0].AmpTrim270 = read_int_from_file(ridat_file)
-
-        sys_params.rf_channels[1].SF = read_double_from_file(ridat_file)
-        sys_params.rf_channels[1].Offset = read_double_from_file(ridat_file)
-        sys_params.rf_channels[1].MultReg = read_int_from_file(ridat_file)
-        sys_params.rf_channels[1].PhaseTwiddle = read_int_from_file(ridat_file)
-        sys_params.rf_channels[1].ChanAOffset = read_int_from_file(ridat_file)
-        sys_params.rf_channels[1].ChanBOffset = read_int_from_file(ridat_file)
-        sys_params.rf_channels[1].ExtAPhaseTrim = read_int_from_file(ridat_file)
-        sys_params.rf_channels[1].ExtAAmpTrim = read_int_from_file(ridat_file)
-        sys_params.rf_channels[1].ExtBPhaseTrim = read_int_from_file(ridat_file)
-        sys_params.rf_channels[1].ExtBAmpTrim = read_int_from_file(ridat_file)
-        sys_params.rf_channels[1].IntAAmpTrim = read_int_from_file(ridat_file)
-        sys_params.rf_channels[1].IntBAmpTrim = read_int_from_file(ridat_file)
-        sys_params.rf_channels[1].PhaseTrim0 = read_int_from_file(ridat_file)
-        sys_params.rf_channels[1].AmpTrim0 = read_int_from_file(ridat_file)
-        sys_params.rf_channels[1].PhaseTrim90 = read_int_from_file(ridat_file)
-        sys_params.rf_channels[1].AmpTrim90 = read_int_from_file(ridat_file)
-        sys_params.rf_channels[1].PhaseTrim180 = read_int_from_file(ridat_file)
-        sys_params.rf_channels[1].AmpTrim180 = read_int_from_file(ridat_file)
-        sys_params.rf_channels[1].PhaseTrim270 = read_int_from_file(ridat_file)
-        sys_params.rf_channels[1].AmpTrim270 = read_int_from_file(ridat_file)
-
-        sys_params.rf_channels[2].SF = read_double_from_file(ridat_file)
-        sys_params.rf_channels[2].Offset = read_double_from_file(ridat_file)
-        sys_params.rf_channels[2].MultReg = read_int_from_file(ridat_file)
-        sys_params.rf_channels[2].PhaseTwiddle = read_int_from_file(ridat_file)
-        sys_params.rf_channels[2].ChanAOffset = read_int_from_file(ridat_file)
-        sys_params.rf_channels[2].ChanBOffset = read_int_from_file(ridat_file)
-        sys_params.rf_channels[2].ExtAPhaseTrim = read_int_from_file(ridat_file)
-        sys_params.rf_channels[2].ExtAAmpTrim = read_int_from_file(ridat_file)
-        sys_params.rf_channels[2].ExtBPhaseTrim = read_int_from_file(ridat_file)
-        sys_params.rf_channels[2].ExtBAmpTrim = read_int_from_file(ridat_file)
-        sys_params.rf_channels[2].IntAAmpTrim = read_int_from_file(ridat_file)
-        sys_params.rf_channels[2].IntBAmpTrim = read_int_from_file(ridat_file)
-        sys_params.rf_channels[2].PhaseTrim0 = read_int_from_file(ridat_file)
-        sys_params.rf_channels[2].AmpTrim0 = read_int_from_file(ridat_file)
-        sys_params.rf_channels[2].PhaseTrim90 = read_int_from_file(ridat_file)
-        sys_params.rf_channels[2].AmpTrim90 = read_int_from_file(ridat_file)
-        sys_params.rf_channels[2].PhaseTrim180 = read_int_from_file(ridat_file)
-        sys_params.rf_channels[2].AmpTrim180 = read_int_from_file(ridat_file)
-        sys_params.rf_channels[2].PhaseTrim270 = read_int_from_file(ridat_file)
-        sys_params.rf_channels[2].AmpTrim270 = read_int_from_file(ridat_file)
-
-        sys_params.rf_channels[0].quadtrim = read_int_from_file(ridat_file)
-        sys_params.rf_channels[1].quadtrim = read_int_from_file(ridat_file)
-        sys_params.rf_channels[2].quadtrim = read_int_from_file(ridat_file)
-
-        sys_params.GSH1 = read_string_from_file(ridat_file, 20)
-        sys_params.GSH2 = read_string_from_file(ridat_file, 20)
-        sys_params.GSH3 = read_string_from_file(ridat_file, 20)
-        sys_params.GSH4 = read_string_from_file(ridat_file, 20)
-        sys_params.GSH5 = read_string_from_file(ridat_file, 20)
-
-        sys_params.EndTime = read_double_from_file(ridat_file)
-
-        sys_params.PreXK[0] = read_float_from_file(ridat_file)
-        sys_params.PreXA[0] = read_float_from_file(ridat_file)
-        sys_params.PreXK[1] = read_float_from_file(ridat_file)
-        sys_params.PreXA[1] = read_float_from_file(ridat_file)
-        sys_params.PreXK[2] = read_float_from_file(ridat_file)
-        sys_params.PreXA[2] = read_float_from_file(ridat_file)
-        sys_params.PreXK[3] = read_float_from_file(ridat_file)
-        sys_params.PreXA[3] = read_float_from_file(ridat_file)
-
-        sys_params.PreYK[0] = read_float_from_file(ridat_file)
-        sys_params.PreYA[0] = read_float_from_file(ridat_file)
-        sys_params.PreYK[1] = read_float_from_file(ridat_file)
-        sys_params.PreYA[1] = read_float_from_file(ridat_file)
-        sys_params.PreYK[2] = read_float_from_file(ridat_file)
-        sys_params.PreYA[2] = read_float_from_file(ridat_file)
-        sys_params.PreYK[3] = read_float_from_file(ridat_file)
-        sys_params.PreYA[3] = read_float_from_file(ridat_file)
-
-        sys_params.PreZK[0] = read_float_from_file(ridat_file)
-        sys_params.PreZA[0] = read_float_from_file(ridat_file)
-        sys_params.PreZK[1] = read_float_from_file(ridat_file)
-        sys_params.PreZA[1] = read_float_from_file(ridat_file)
-        sys_params.PreZK[2] = read_float_from_file(ridat_file)
-        sys_params.PreZA[2] = read_float_from_file(ridat_file)
-        sys_params.PreZK[3] = read_float_from_file(ridat_file)
-        sys_params.PreZA[3] = read_float_from_file(ridat_file)
-
-        sys_params.XB0K = read_float_from_file(ridat_file)
-        sys_params.XB0A = read_float_from_file(ridat_file)
-        sys_params.YB0K = read_float_from_file(ridat_file)
-        sys_params.YB0A = read_float_from_file(ridat_file)
-        sys_params.ZB0K = read_float_from_file(ridat_file)
-        sys_params.ZB0A = read_float_from_file(ridat_file)
-
-        sys_params.DummyPar1 = read_float_from_file(ridat_file)
-        sys_params.DummyPar2 = read_float_from_file(ridat_file)
-
-        sys_params.Dec90 = read_float_from_file(ridat_file)
-        sys_params.CPD = read_string_from_file(ridat_file, 20)
-        sys_params.Trigger = read_int_from_file(ridat_file)
-        sys_params.XB0 = read_float_from_file(ridat_file)
-        sys_params.YB0 = read_float_from_file(ridat_file)
-        sys_params.ZB0 = read_float_from_file(ridat_file)
-        sys_params.XOffset = read_float_from_file(ridat_file)
-        sys_params.YOffset = read_float_from_file(ridat_file)
-        sys_params.ZOffset = read_float_from_file(ridat_file)
-        sys_params.Acquisition = read_int_from_file(ridat_file)
-
-        SysEndMark = read_int_from_file(ridat_file)
-
-        # ###################################################################################################
-        # #################################################################################### APP PARAMETERS
-        ridat_file.seek(Sect1Size + Sect2Size)
-        app_params = AppParameters()
-
-        app_params.SI = read_int_from_file(ridat_file)
-        app_params.DW = read_float_from_file(ridat_file)
-        app_params.Pulses = read_data_sequence_from_file('f', 5, ridat_file)
-        app_params.RD = read_float_from_file(ridat_file)
-        app_params.tau = read_float_from_file(ridat_file)
-        app_params.Delays[:5] = read_data_sequence_from_file('f', 5, ridat_file)
-        app_params.NS = read_int_from_file(ridat_file)
-        app_params.FW = read_float_from_file(ridat_file)
-        app_params.PH1 = read_string_from_file(ridat_file, 132)
-        app_params.PH2 = read_string_from_file(ridat_file, 132)
-        app_params.PH3 = read_string_from_file(ridat_file, 132)
-        app_params.PH4 = read_string_from_file(ridat_file, 132)
-        app_params.PH5 = read_string_from_file(ridat_file, 132)
-        app_params.RG = read_float_from_file(ridat_file)
-        app_params.NECH = read_int_from_file(ridat_file)
-        app_params.SW = read_double_from_file(ridat_file)
-        app_params.DB = read_int_from_file(ridat_file)
-        app_params.Bessel = read_double_from_file(ridat_file)
-        app_params.Butterworth = read_double_from_file(ridat_file)
-        app_params.SequenceName = read_string_from_file(ridat_file, 32)
-        app_params.RfAmps_ch0 = read_data_sequence_from_file('f', 6, ridat_file)
-        app_params.RfAmps_ch1 = read_data_sequence_from_file('f', 6, ridat_file)
-        app_params.WW = read_float_from_file(ridat_file)
-        app_params.Counters[:5] = read_data_sequence_from_file('i', 5, ridat_file)
-        app_params.GRead = read_int_from_file(ridat_file)
-        app_params.GPhase = read_int_from_file(ridat_file)
-        app_params.GSlice = read_int_from_file(ridat_file)
-        app_params.Gradients[:9] = read_data_sequence_from_file('i', 9, ridat_file)
-        app_params.MAC1 = read_float_from_file(ridat_file)
-        app_params.MAC2 = read_float_from_file(ridat_file)
-        app_params.SH1 = read_string_from_file(ridat_file, 20)
-        app_params.SH2 = read_string_from_file(ridat_file, 20)
-        app_params.SH3 = read_string_from_file(ridat_file, 20)
-        app_params.SH4 = read_string_from_file(ridat_file, 20)
-        app_params.SH5 = read_string_from_file(ridat_file, 20)
-        app_params.DS = read_int_from_file(ridat_file)
-        app_params.NA = read_int_from_file(ridat_file)
-        app_params.GradientsIncrements = read_data_sequence_from_file('i', 9, ridat_file)
-        app_params.DimX = read_int_from_file(ridat_file)
-        app_params.DimY = read_int_from_file(ridat_file)
-        app_params.DimZ = read_int_from_file(ridat_file)
-        app_params.DimC = read_int_from_file(ridat_file)
-        app_params.ImageEchos = read_int_from_file(ridat_file)
-        app_params.ImageSlices = read_int_from_file(ridat_file)
-        app_params.Delays[5:12] = read_data_sequence_from_file('f', 7, ridat_file)
-        app_params.GradPhase = read_string_from_file(ridat_file, 4)
-        app_params.GradSlice = read_string_from_file(ridat_file, 4)
-        app_params.GradRead = read_string_from_file(ridat_file, 4)
-        app_params.TimePoints = read_int_from_file(ridat_file)
-        app_params.SNR = read_int_from_file(ridat_file)
-        app_params.Counters[5:12] = read_data_sequence_from_file('i', 7, ridat_file)
-        app_params.FPs = read_data_sequence_from_file('f', 5, ridat_file)
-        app_params.GREADX = read_float_from_file(ridat_file)
-        app_params.GREADY = read_float_from_file(ridat_file)
-        app_params.GREADZ = read_float_from_file(ridat_file)
-        app_params.GPHASEX = read_float_from_file(ridat_file)
-        app_params.GPHASEY = read_float_from_file(ridat_file)
-        app_params.GPHASEZ = read_float_from_file(ridat_file)
-        app_params.GSLICEX = read_float_from_file(ridat_file)
-        app_params.GSLICEY = read_float_from_file(ridat_file)
-        app_params.GSLICEZ = read_float_from_file(ridat_file)
-        app_params.Delays[12:32] = read_data_sequence_from_file('f', 20, ridat_file)
-        app_params.Counters[12:32] = read_data_sequence_from_file('i', 20, ridat_file)
-        app_params.Gradients[9:32] = read_data_sequence_from_file('i', 23, ridat_file)
-        app_params.MoreGains = read_data_sequence_from_file('f', 9, ridat_file)
-
-        AppEndMark = read_int_from_file(ridat_file)
-
-        # ###################################################################################################
-        # ############################################################################# PROCESSING PARAMETERS
-        ridat_file.seek(Sect1Size + Sect2Size + Sect3Size)
-        proc_params = ProcessingParameters()
-
-        proc_params.ProcFlags = read_int_from_file(ridat_file)
-        proc_params.ProcDummies = read_data_sequence_from_file('i', 9, ridat_file)
-        proc_params.LB = read_float_from_file(ridat_file)
-        proc_params.PA = read_float_from_file(ridat_file)
-        proc_params.PB = read_float_from_file(ridat_file)
-        proc_params.DP = read_float_from_file(ridat_file)
-        proc_params.SMP = read_int_from_file(ridat_file)
-        proc_params.PivotPoint = read_int_from_file(ridat_file)
-        proc_params.NOBC = read_int_from_file(ridat_file)
-        proc_params.PPRF = read_int_from_file(ridat_file)
-        proc_params.PPTH = read_double_from_file(ridat_file)
-        proc_params.PPBL = read_double_from_file(ridat_file)
-        proc_params.PPAF = read_int_from_file(ridat_file)
-        proc_params.INC2D = read_float_from_file(ridat_file)
-        proc_params.SD2D = read_double_from_file(ridat_file)
-
-        ProcEndMark = read_int_from_file(ridat_file)
-
-        # ###################################################################################################
-        # ############################################################################################## DATA
-        real_values, imag_values, time_values = [], [], []
-        ridat_file.seek(Sect1Size + Sect2Size + Sect3Size + Sect4Size)
+# Memory-mapped view of a .RiDat file. The parameters are parsed when the file is opened, but the data section
+# is never copied: "real", "imag" and "time" are strided views (float32, float32 and float64) over the mapped
+# records, and "signal" views the real and imaginary pairs as complex64. Slicing or converting these arrays is
+# what actually reads the bytes from disk, so many acquisitions can be kept open with little memory.
+# Use it as a context manager (or call close()) to release the mapping.
+class RiDatFile(object):
+    def __init__(self, f_path):
+        self.path = f_path
+        with open(f_path, 'rb') as ridat_file:
+            self.parameters, self.data_offset = _read_ridat_header(ridat_file)
+            self.num_points = _count_data_records(ridat_file, self.data_offset)
+            self._mmap = mmap.mmap(ridat_file.fileno(), 0, access=mmap.ACCESS_READ)
 
+        self.records = np.frombuffer(self._mmap, dtype=RIDAT_RECORD_DTYPE,
+                                     count=self.num_points, offset=self.data_offset)
+        self.real = self.records['real']
+        self.imag = self.records['imag']
+        self.time = self.records['time']
+
+    # the real and imaginary channels viewed as a single complex64 array (no copy).
+    @property
+    def signal(self):
+        return np.ndarray(shape=(self.num_points,), dtype=np.complex64, buffer=self._mmap,
+                          offset=self.data_offset, strides=(RIDAT_RECORD_DTYPE.itemsize,))
+
+    @property
+    def title(self):
+        return self.parameters.title
+
+    def __len__(self):
+        return self.num_points
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # releases the views and the memory map. If the caller still holds views (or slices of them), the mapping
+    # stays alive until those are garbage collected.
+    def close(self):
+        if self._mmap is None:
+            return
+        self.records = self.real = self.imag = self.time = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+        self._mmap = None
+
+
+# Follows a .RiDat file that is still being written, e.g. during a long acquisition. The header sections are parsed
+# once, and each call to "poll" returns (time, real, imag) np.float64 arrays with only the complete records appended
+# since the previous call. A partially written trailing record is held back until it is complete.
+class RiDatFollower(object):
+    def __init__(self, f_path):
+        self.path = f_path
+        self._file = open(f_path, 'rb')
+        try:
+            self.parameters, self.data_offset = _read_ridat_header(self._file)
+        except Exception:
+            self._file.close()
+            raise
+        self.num_points = 0
+
+    def poll(self):
+        position = self.data_offset + self.num_points * RIDAT_RECORD_DTYPE.itemsize
+        available = (os.fstat(self._file.fileno()).st_size - position) // RIDAT_RECORD_DTYPE.itemsize
+        if available <= 0:
+            return decode_data_section(b'')
+
+        self._file.seek(position)
+        data_bytes = self._file.read(available * RIDAT_RECORD_DTYPE.itemsize)
+        available = len(data_bytes) // RIDAT_RECORD_DTYPE.itemsize
+        self.num_points += available
+        return decode_data_section(data_bytes[:available * RIDAT_RECORD_DTYPE.itemsize])
+
+    # generator that polls the file every "interval" seconds and yields the new (time, real, imag) records.
+    # Stops after "idle_timeout" seconds without new data (never, if it is None).
+    def follow(self, interval=1.0, idle_timeout=None):
+        last_data = time.monotonic()
         while True:
-            try:
-                real_values.append(read_float_from_file(ridat_file))
-                imag_values.append(read_float_from_file(ridat_file))
-                time_values.append(read_double_from_file(ridat_file))
-            except:
+            time_values, real_values, imag_values = self.poll()
+            if time_values.size:
+                last_data = time.monotonic()
+                yield time_values, real_values, imag_values
+            elif idle_timeout is not None and time.monotonic() - last_data > idle_timeout:
+                return
+            else:
+                time.sleep(interval)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+
+# ###################################################################################################
+# #################################################################################### INSTRUMENTATION
+
+# Opt-in instrumentation of "read_ridat_file" and "export_ridat_data_to_text_file": pass a RiDatStats as their
+# "stats" argument. It records the wall time (in seconds) of each phase of the call in "phases" ('open',
+# 'id_header', 'parameter_read', 'sys', 'app', 'proc', 'data_read', 'data_decode', and 'export_format' and
+# 'export_write' for the export), the bytes read from the .RiDat file, the number of read system calls made on it
+# (the file is opened unbuffered), and the number of samples decoded. The "sys", "app" and "proc" phases time the
+# decoding of all the fields of each section, which without stats only happens when the fields are accessed.
+# "callback" is called with the stats when the call is done, e.g. to forward "as_dict()" to a metrics pipeline.
+# The same object can be reused across calls: the values add up.
+# Without "stats", the functions run exactly as before.
+class RiDatStats(object):
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.phases = collections.OrderedDict()
+        self.bytes_read = 0
+        self.read_calls = 0
+        self.samples = 0
+
+    # adds the time since "start" (from time.perf_counter) to a phase, and returns the current time, so that
+    # consecutive phases can be chained.
+    def add_phase(self, name, start):
+        now = time.perf_counter()
+        self.phases[name] = self.phases.get(name, 0.0) + now - start
+        return now
+
+    def finish(self):
+        if self.callback is not None:
+            self.callback(self)
+
+    def as_dict(self):
+        return {'phases': dict(self.phases), 'total_seconds': sum(self.phases.values()),
+                'bytes_read': self.bytes_read, 'read_calls': self.read_calls, 'samples': self.samples}
+
+    def __repr__(self):
+        return 'RiDatStats(%r)' % self.as_dict()
+
+
+# unbuffered binary file that counts the read system calls done on it into a RiDatStats. Each read is a loop of
+# raw reads (one system call each) until "size" bytes, or the end of the file, are reached. Only used when stats
+# are requested.
+class _CountingFile(object):
+    def __init__(self, raw_file, stats):
+        self._file = raw_file
+        self._stats = stats
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = max(os.fstat(self._file.fileno()).st_size - self._file.tell(), 0)
+        pieces, remaining = [], size
+        while remaining > 0:
+            piece = self._file.read(remaining)
+            self._stats.read_calls += 1
+            if not piece:
                 break
+            pieces.append(piece)
+            remaining -= len(piece)
+        data = b''.join(pieces) if len(pieces) != 1 else pieces[0]
+        self._stats.bytes_read += len(data)
+        return data
 
-        real_values = np.array(real_values, dtype=np.float64)
-        imag_values = np.array(imag_values, dtype=np.float64)
-        time_values = np.array(time_values, dtype=np.float64)
+    def __getattr__(self, name):
+        return getattr(self._file, name)
 
-        # ###################################################################################################
-        # ###################################################################################################
+    def __enter__(self):
+        return self
 
-    acquisition_parameters = AcquisitionParameters(sys_params, app_params, proc_params, Comment)
-    return time_values, real_values, imag_values, acquisition_parameters
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._file.close()
+
+
+def _open_counting(f_path, stats):
+    return _CountingFile(open(f_path, 'rb', buffering=0), stats)
+
+
+# ###################################################################################################
+# ########################################################################################## TIME AXIS
+
+# Compact, read-only time axis made of uniformly sampled segments: segment i starts at point "first_points[i]" with
+# the value "starts[i]", and goes up by "steps[i]" per point until the next segment. The segments can also describe
+# a single period of "period" points, repeated over the whole axis with each period shifted by "period_shift".
+# A plain acquisition is a single segment (first time and DW), and a CPMG train is a single periodic segment (first
+# time and DW, repeated every "points per echo" points with the echo spacing as shift, see "periodic"), so both take
+# a constant amount of memory whatever their number of points and echoes.
+# It behaves like a 1D np.float64 array: len(), indexing with ints, slices, index arrays and boolean masks (the
+# values are computed only for the selected points), arithmetic and numpy functions (np.asarray(axis) builds the
+# full array).
+class RiDatTimeAxis(np.lib.mixins.NDArrayOperatorsMixin):
+    dtype = np.dtype(np.float64)
+    ndim = 1
+
+    def __init__(self, first_points, starts, steps, size, period=None, period_shift=0.0):
+        self.first_points = np.asarray(first_points, dtype=np.int64)
+        self.starts = np.asarray(starts, dtype=np.float64)
+        self.steps = np.asarray(steps, dtype=np.float64)
+        self.size = int(size)
+        self.shape = (self.size,)
+        self.period = max(self.size, 1) if period is None else int(period)
+        self.period_shift = float(period_shift)
+        if self.period < 1:
+            raise ValueError("The period of a time axis must be at least one point.")
+
+    # axis of "size" points in echoes of "points_per_echo" points spaced by "dw", the echoes starting every
+    # "echo_spacing", from "first_time" on.
+    @classmethod
+    def periodic(cls, first_time, dw, points_per_echo, echo_spacing, size):
+        return cls([0], [first_time], [dw], size, points_per_echo, echo_spacing)
+
+    @property
+    def is_periodic(self):
+        return self.period < self.size
+
+    @property
+    def is_uniform(self):
+        return self.first_points.size == 1 and not self.is_periodic
+
+    @property
+    def nbytes(self):
+        return self.first_points.nbytes + self.starts.nbytes + self.steps.nbytes
+
+    def __len__(self):
+        return self.size
+
+    # time values of an array of point indices (already in range and non negative).
+    def _values(self, indices):
+        periods, indices = np.divmod(indices, self.period)
+        segments = np.searchsorted(self.first_points, indices, side='right') - 1
+        return (self.starts[segments] + self.steps[segments] * (indices - self.first_points[segments])
+                + periods * self.period_shift)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            index = key + self.size if key < 0 else key
+            if not 0 <= index < self.size:
+                raise IndexError("index %d is out of bounds for a time axis of %d points" % (key, self.size))
+            return self._values(np.array([index]))[0]
+        if isinstance(key, slice):
+            return self._values(np.arange(*key.indices(self.size)))
+        return self._values(np.arange(self.size)[key])
+
+    def __iter__(self):
+        return iter(self.to_array())
+
+    def to_array(self):
+        return self._values(np.arange(self.size))
+
+    def __array__(self, dtype=None, copy=None):
+        values = self.to_array()
+        return values if dtype is None else values.astype(dtype, copy=False)
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        inputs = tuple(value.to_array() if isinstance(value, RiDatTimeAxis) else value for value in inputs)
+        return getattr(ufunc, method)(*inputs, **kwargs)
+
+    def __repr__(self):
+        segments = '%d segment%s' % (self.first_points.size, '' if self.first_points.size == 1 else 's')
+        if self.is_periodic:
+            segments += ' repeated every %d points' % self.period
+        return 'RiDatTimeAxis(%d points, %s)' % (self.size, segments)
+
+
+# Looks for uniformly sampled segments in "time_values" and returns them as a RiDatTimeAxis, or the array itself
+# when the axis is irregular: when it would take more than "max_segments" segments (by default, one per 16 points),
+# or when any rebuilt value is more than "rtol" (relative to the largest time value) away from the stored one.
+# A point starts a new segment when its spacing to the next point differs from the spacing before it; since a new
+# segment takes its step from the spacing after its first point, the point right after a segment start never needs
+# one, which keeps a single segment per echo in CPMG trains. When the segments all have the same number of points,
+# the axis is first tried as a single periodic segment (RiDatTimeAxis.periodic), which is the usual CPMG train.
+# Axes with NaN or infinite values are never compacted.
+def compact_time_axis(time_values, rtol=1e-12, max_segments=None):
+    time_values = np.asarray(time_values, dtype=np.float64)
+    size = time_values.size
+    if time_values.ndim != 1 or size < 2 or not np.isfinite(time_values).all():
+        return time_values
+    if max_segments is None:
+        max_segments = max(size // 16, 1)
+    atol = rtol * max(float(np.abs(time_values).max()), np.finfo(np.float64).tiny)
+
+    spacing = np.diff(time_values)
+    candidates = np.flatnonzero(np.abs(spacing[1:] - spacing[:-1]) > atol) + 2
+    if candidates.size:
+        # in a run of consecutive candidates, only every other one starts a segment.
+        run_start = np.ones(candidates.size, dtype=bool)
+        run_start[1:] = np.diff(candidates) != 1
+        run_first = np.maximum.accumulate(np.where(run_start, candidates, 0))
+        candidates = candidates[(candidates - run_first) % 2 == 0]
+
+        if np.array_equal(candidates, np.arange(1, candidates.size + 1) * candidates[0]):
+            axis = _periodic_time_axis(time_values, candidates[0], atol)
+            if axis is not None:
+                return axis
+    if candidates.size + 1 > max_segments:
+        return time_values
+
+    first_points = np.concatenate(([0], candidates))
+    last_points = np.append(first_points[1:], size) - 1
+    # the step of each segment is taken from its end points, which spreads the rounding over the whole segment.
+    lengths = last_points - first_points
+    steps = np.where(lengths > 0, (time_values[last_points] - time_values[first_points]) / np.maximum(lengths, 1),
+                     0.0)
+    axis = RiDatTimeAxis(first_points, time_values[first_points], steps, size)
+    if not np.abs(axis.to_array() - time_values).max() <= atol:
+        return time_values
+    return axis
+
+
+# "time_values" as echoes of "points_per_echo" uniformly spaced points, or None if they are not within "atol".
+# DW is averaged over the spacings inside the echoes, and the echo spacing over all the echoes.
+def _periodic_time_axis(time_values, points_per_echo, atol):
+    size = time_values.size
+    inside_echo = np.arange(size - 1) % points_per_echo != points_per_echo - 1
+    dw = float(np.diff(time_values)[inside_echo].mean()) if points_per_echo > 1 else 0.0
+    last_echo_start = (size - 1) // points_per_echo * points_per_echo
+    echo_spacing = (time_values[last_echo_start] - time_values[0]) / (last_echo_start // points_per_echo)
+    axis = RiDatTimeAxis.periodic(time_values[0], dw, points_per_echo, echo_spacing, size)
+    if not np.abs(axis.to_array() - time_values).max() <= atol:
+        return None
+    return axis
+
+
+# ###################################################################################################
+# ######################################################################################## BATCH READS
+
+# reads the parameters of one file, and the position and number of records of its data section.
+def _read_ridat_layout(f_path):
+    with open(f_path, 'rb') as ridat_file:
+        acquisition_parameters, data_offset = _read_ridat_header(ridat_file)
+        num_points = _count_data_records(ridat_file, data_offset)
+    return acquisition_parameters, data_offset, num_points
+
+
+# decodes the data section of one file straight into row "row" of the (3, files, points) output array.
+def _decode_data_into(f_path, data_offset, num_points, out, row):
+    with open(f_path, 'rb') as ridat_file:
+        ridat_file.seek(data_offset)
+        data_bytes = ridat_file.read(num_points * RIDAT_RECORD_DTYPE.itemsize)
+    if len(data_bytes) < num_points * RIDAT_RECORD_DTYPE.itemsize:
+        raise IOError("The file %s got shorter while it was being read." % f_path)
+    records = np.frombuffer(data_bytes, dtype=RIDAT_RECORD_DTYPE)
+    out[0, row, :num_points] = records['time']
+    out[1, row, :num_points] = records['real']
+    out[2, row, :num_points] = records['imag']
+
+
+# same as _decode_data_into, for worker processes: the output array lives in a shared memory block, so the
+# decoded data is never pickled back to the parent process.
+def _decode_data_into_shared_memory(shm_name, shape, f_path, data_offset, num_points, row):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        _decode_data_into(f_path, data_offset, num_points, out, row)
+        del out
+    finally:
+        shm.close()
+
+
+# Reads many .RiDat files in parallel (e.g. a whole T1/T2 series). Returns time, real and imag as 2D np.float64
+# arrays of shape (files, points); files with fewer points than the longest one are padded with "fill_value".
+# Also returns the list of AcquisitionParameters and an array with the number of points of each file.
+# The work is spread over "workers" threads (numpy and file reads release the GIL), or over worker processes if
+# "use_processes" is True, in which case the arrays are filled through shared memory. The shared block is then
+# copied into regular arrays, so that it can be released before returning: the peak memory of the process mode is
+# twice the size of the output (3 * files * points * 8 bytes). The threads fill the output arrays directly.
+def read_ridat_files(paths, workers=None, use_processes=False, fill_value=np.nan):
+    paths = list(paths)
+    workers = workers or os.cpu_count() or 1
+    executor_class = concurrent.futures.ProcessPoolExecutor if use_processes else concurrent.futures.ThreadPoolExecutor
+    if use_processes and os.name == 'posix':
+        # the workers must share the parent's resource tracker, so that the shared memory block they attach to is
+        # only tracked once, and is released by the parent's unlink. Otherwise each worker starts its own tracker,
+        # which tries to free the block again when it exits.
+        resource_tracker.ensure_running()
+
+    with executor_class(max_workers=workers) as executor:
+        layouts = list(executor.map(_read_ridat_layout, paths))
+        acquisition_parameters = [layout[0] for layout in layouts]
+        num_points = np.array([layout[2] for layout in layouts], dtype=np.int64)
+        shape = (3, len(paths), int(num_points.max()) if len(paths) else 0)
+
+        if not use_processes:
+            out = np.full(shape, fill_value, dtype=np.float64)
+            futures = [executor.submit(_decode_data_into, path, layout[1], layout[2], out, row)
+                       for row, (path, layout) in enumerate(zip(paths, layouts))]
+            for future in futures:
+                future.result()
+        else:
+            shm = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * 8, 1))
+            try:
+                shared_out = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+                shared_out[...] = fill_value
+                futures = [executor.submit(_decode_data_into_shared_memory, shm.name, shape, path,
+                                           layout[1], layout[2], row)
+                           for row, (path, layout) in enumerate(zip(paths, layouts))]
+                for future in futures:
+                    future.result()
+                # the block must be closed and unlinked, so the arrays returned can not be views of it.
+                out = shared_out.copy()
+                del shared_out
+            finally:
+                shm.close()
+                shm.unlink()
+
+    return out[0], out[1], out[2], acquisition_parameters, num_points
+
+
+# ###################################################################################################
+# ############################################################################################ WRITING
+
+# collects the values of a parameter class for _SectionLayout.pack. Dummies are written as 0.
+def _section_values(section, params, end_mark):
+    fields = {}
+    for name in section.fields:
+        if name.endswith('EndMark'):
+            fields[name] = end_mark
+        elif name.startswith('_'):
+            fields[name] = 0
+        elif '.' in name:
+            channel, channel_name = name.split('.')
+            fields[name] = getattr(params.rf_channels[int(channel[2:])], channel_name)
+        else:
+            fields[name] = getattr(params, name)
+    return fields
+
+
+# Writes a .RiDat file (magic number 190955, version 0) from the time, real and imag arrays, and the parameters in
+# "acquisition_parameters" (an AcquisitionParameters; if None, all parameters are zero). The real and imag values
+# are stored as float32 and the time values as float64, as in the files written by RINMR. Each section is written
+# with exactly the size of its layout, and all the end marks are set to "end_mark" (the readers ignore them, but
+# validate_ridat_file checks that they agree, or that they are equal to its own "end_mark").
+def write_ridat_file(f_path, time_values, real_values, imag_values, acquisition_parameters=None, title=None,
+                     end_mark=RIDAT_MAGIC_NUMBER):
+    time_values, real_values, imag_values = np.ravel(time_values), np.ravel(real_values), np.ravel(imag_values)
+    if not time_values.size == real_values.size == imag_values.size:
+        raise ValueError("The time, real and imag arrays must have the same number of points.")
+    if acquisition_parameters is None:
+        acquisition_parameters = AcquisitionParameters(SysParameters(), AppParameters(), ProcessingParameters(), "")
+    if title is None:
+        title = acquisition_parameters.title
+
+    id_fields = {'MagicNumber': RIDAT_MAGIC_NUMBER, 'FileVersion': 0, 'Sect1Size': _ID_SECTION.size,
+                 'Sect2Size': _SYS_SECTION.size, 'Sect3Size': _APP_SECTION.size, 'Sect4Size': _PROC_SECTION.size,
+                 'Comment': title, '_IdEndMark': end_mark}
+
+    records = np.empty(time_values.size, dtype=RIDAT_RECORD_DTYPE)
+    records['real'] = real_values
+    records['imag'] = imag_values
+    records['time'] = time_values
+
+    with open(f_path, 'wb') as ridat_file:
+        ridat_file.write(_ID_SECTION.pack(id_fields))
+        ridat_file.write(_SYS_SECTION.pack(_section_values(_SYS_SECTION, acquisition_parameters.sys, end_mark)))
+        ridat_file.write(_APP_SECTION.pack(_section_values(_APP_SECTION, acquisition_parameters.app, end_mark)))
+        ridat_file.write(_PROC_SECTION.pack(_section_values(_PROC_SECTION, acquisition_parameters.proc, end_mark)))
+        records.tofile(ridat_file)
+
+
+# ###################################################################################################
+# ############################################################################################## CACHE
+
+# new parameters over the same (immutable) header bytes as "acquisition_parameters", with no field decoded yet. The
+# cache only keeps parameters that are never handed out, so they always match the file.
+def _fresh_parameters(acquisition_parameters):
+    sections = [type(params)(params._buffer, params._offset)
+                for params in (acquisition_parameters.sys, acquisition_parameters.app, acquisition_parameters.proc)]
+    return AcquisitionParameters(sections[0], sections[1], sections[2], acquisition_parameters.title)
+
+
+# Opt-in cache around read_ridat_file, for services that read the same files over and over. Entries are keyed on the
+# absolute path of the file, and are only reused while the file's size and mtime are unchanged. Once the cached
+# arrays take more than "max_bytes", the least recently used entries are evicted. The cached arrays are read-only,
+# so callers can not corrupt the cache (copy them before modifying them in place), and every call returns its own
+# AcquisitionParameters (cheap, since they share the header bytes and decode them lazily).
+# The "hits", "misses" and "evictions" counters (and the "stats" method) can be forwarded to a monitoring system.
+class RiDatCache(object):
+    def __init__(self, max_bytes=256 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits, self.misses, self.evictions = 0, 0, 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    # same as read_ridat_file, but returns the cached result while the file is unchanged.
+    def read_ridat_file(self, f_path):
+        key = os.path.abspath(f_path)
+        file_stat = os.stat(key)
+        signature = (file_stat.st_size, file_stat.st_mtime_ns)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1][:3] + (_fresh_parameters(entry[1][3]),)
+            self.misses += 1
+
+        result = read_ridat_file(f_path)
+        for array in result[:3]:
+            array.setflags(write=False)
+        size = sum(array.nbytes for array in result[:3])
+
+        with self._lock:
+            self._discard(key)
+            if size <= self.max_bytes:
+                self._entries[key] = (signature, result[:3] + (_fresh_parameters(result[3]),), size)
+                self.current_bytes += size
+                while self.current_bytes > self.max_bytes:
+                    self._discard(next(iter(self._entries)))
+                    self.evictions += 1
+        return result
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[2]
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self._entries), 'bytes': self.current_bytes, 'max_bytes': self.max_bytes}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# ###################################################################################################
+# ############################################################################################# EXPORT
+
+# number of records decoded and written at a time by the export functions.
+EXPORT_CHUNK_POINTS = 65536
 
 
 # this function opens a .RiDat and saves the time, real and imag data into a text file.
 # inputs are the path of the .Ridat, and the path of the file to save.
-def export_ridat_data_to_text_file(ridat_path, save_path, delimiter='\t'):
+# The output is the same as np.savetxt would write, but the file is formatted in chunks with a single string
+# formatting operation per chunk, instead of row by row, and the whole data is never held in memory at once.
+# If a RiDatStats is given as "stats", the phases of the read, the formatting ("export_format") and the writing
+# ("export_write") of the text are timed in it.
+# The header of the .RiDat is parsed before "save_path" is created, so a corrupted file leaves no output behind.
+def export_ridat_data_to_text_file(ridat_path, save_path, delimiter='\t', chunk_points=EXPORT_CHUNK_POINTS,
+                                   stats=None):
     if not delimiter:
         raise ValueError("The delimiter can not be empty.")
-    time, real, imag, acq_params = read_ridat_file(ridat_path)
-    data = np.zeros((time.size, 3), dtype=np.float64)
-    data[:, 0], data[:, 1], data[:, 2] = time, real, imag
+    if chunk_points < 1:
+        raise ValueError("chunk_points must be a positive number of points.")
     header = 'Time (us)' + delimiter + "Real (Machine Units)" + delimiter + "Imag (Machine Units)"
-    np.savetxt(save_path, data, delimiter=delimiter, header=header)
+    row_format = delimiter.join(['%.18e'] * 3) + '\n'
+    chunks = _iter_ridat_chunks(ridat_path, chunk_points, stats)
+    with open(save_path, 'w') as text_file:
+        text_file.write('# ' + header + '\n')
+        for time_values, real_values, imag_values in chunks:
+            start = time.perf_counter() if stats is not None else None
+            rows = np.column_stack((time_values, real_values, imag_values))
+            text = (row_format * time_values.size) % tuple(rows.ravel().tolist())
+            if stats is not None:
+                start = stats.add_phase('export_format', start)
+            text_file.write(text)
+            if stats is not None:
+                stats.add_phase('export_write', start)
+    if stats is not None:
+        stats.finish()
+
+
+# saves the data as a (points, 3) np.float64 .npy file, with the same columns as the text export. The file is
+# memory-mapped and filled chunk by chunk, so the data is never stacked in memory.
+def _export_npy(ridat_path, save_path, chunk_points):
+    if chunk_points < 1:
+        raise ValueError("chunk_points must be a positive number of points.")
+    with open(ridat_path, 'rb') as ridat_file:
+        _, data_offset = _read_ridat_header(ridat_file)
+        num_points = _count_data_records(ridat_file, data_offset)
+        data = np.lib.format.open_memmap(save_path, mode='w+', dtype=np.float64, shape=(num_points, 3))
+        first_point = 0
+        for chunk in _iter_open_ridat_chunks(ridat_file, data_offset, num_points, chunk_points):
+            for column, values in enumerate(chunk):
+                data[first_point:first_point + values.size, column] = values
+            first_point += chunk[0].size
+    data.flush()
+    del data
+
+
+# saves the data as a .npz file with three arrays: "time", "real" and "imag".
+def _export_npz(ridat_path, save_path):
+    time_values, real_values, imag_values = read_ridat_file(ridat_path)[:3]
+    np.savez(save_path, time=time_values, real=real_values, imag=imag_values)
+
+
+# saves the data as an Arrow IPC (.arrow/.feather) or a Parquet table, with "time", "real" and "imag" columns,
+# writing one record batch per chunk. Requires pyarrow.
+def _export_arrow(ridat_path, save_path, chunk_points, parquet):
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Exporting to Arrow or Parquet requires the pyarrow package.")
+
+    schema = pyarrow.schema([('time', pyarrow.float64()), ('real', pyarrow.float64()), ('imag', pyarrow.float64())])
+    if parquet:
+        writer = pyarrow.parquet.ParquetWriter(save_path, schema)
+    else:
+        writer = pyarrow.ipc.new_file(save_path, schema)
+    with writer:
+        for chunk in iter_ridat_chunks(ridat_path, chunk_points):
+            writer.write_table(pyarrow.Table.from_arrays(list(chunk), schema=schema))
+
+
+_EXPORT_EXTENSIONS = {'.npy': 'npy', '.npz': 'npz', '.arrow': 'arrow', '.feather': 'arrow', '.parquet': 'parquet'}
+
+
+# converts the numpy values inside the parameters into something json can write.
+def _parameters_to_json(value):
+    return value.tolist()
+
+
+# saves the acquisition parameters of a .RiDat file (title, "sys", "app" and "proc") as a JSON file.
+def export_ridat_parameters_to_json(ridat_path, save_path):
+    with open(save_path, 'w') as json_file:
+        json.dump(read_ridat_header(ridat_path).to_dict(), json_file, default=_parameters_to_json, indent=1)
+
+
+# Exports the time, real and imag data of a .RiDat file to "save_path". The format is "file_format" or, if it is
+# None, is taken from the extension of save_path:
+# ....".npy": a (points, 3) np.float64 array, with the same columns as the text export
+# ....".npz": three arrays, "time", "real" and "imag"
+# ....".arrow"/".feather" and ".parquet": a table with "time", "real" and "imag" columns (requires pyarrow)
+# ....anything else: text, as in export_ridat_data_to_text_file
+# If "parameters_path" is given, the acquisition parameters are saved there as JSON.
+def export_ridat_data(ridat_path, save_path, file_format=None, delimiter='\t', chunk_points=EXPORT_CHUNK_POINTS,
+                      parameters_path=None):
+    if file_format is None:
+        file_format = _EXPORT_EXTENSIONS.get(os.path.splitext(save_path)[1].lower(), 'text')
+
+    if file_format == 'text':
+        export_ridat_data_to_text_file(ridat_path, save_path, delimiter, chunk_points)
+    elif file_format == 'npy':
+        _export_npy(ridat_path, save_path, chunk_points)
+    elif file_format == 'npz':
+        _export_npz(ridat_path, save_path)
+    elif file_format in ('arrow', 'parquet'):
+        _export_arrow(ridat_path, save_path, chunk_points, parquet=file_format == 'parquet')
+    else:
+        raise ValueError("Unknown export format %r. Use 'text', 'npy', 'npz', 'arrow' or 'parquet'." % file_format)
+    if parameters_path is not None:
+        export_ridat_parameters_to_json(ridat_path, parameters_path)
+
+
+# ###################################################################################################
+# ######################################################################################### VALIDATION
+
+# bytes read at once from the start of each file by validate_ridat_file. This covers the identification header and
+# the parameter sections of files with the standard section sizes, so most files are checked with a single read.
+_VALIDATION_READ_SIZE = 4096
+
+_VALIDATED_SECTIONS = (('identification', _ID_SECTION, 'Sect1Size', '_IdEndMark'),
+                       ('System', _SYS_SECTION, 'Sect2Size', '_SysEndMark'),
+                       ('Application', _APP_SECTION, 'Sect3Size', '_AppEndMark'),
+                       ('Processing', _PROC_SECTION, 'Sect4Size', '_ProcEndMark'))
+
+
+# Checks the structure of a .RiDat file without decoding its data: the magic number and the version, that each
+# section is at least as large as its layout and ends inside the file, and that the data section is a whole number of
+# 16-byte records. The format does not fix the value of the end marks of the sections, so they are compared to
+# "end_mark" when it is given (write_ridat_file uses RIDAT_MAGIC_NUMBER), and otherwise only checked to be the same
+# in the four sections. Only the header bytes are read, and the checks stop at the first problem that makes the rest
+# of the header meaningless.
+# Returns the list of problems found, which is empty for a valid file.
+def validate_ridat_file(f_path, end_mark=None):
+    with open(f_path, 'rb', buffering=0) as ridat_file:
+        file_size = os.fstat(ridat_file.fileno()).st_size
+        header_bytes = ridat_file.read(_VALIDATION_READ_SIZE)
+        if len(header_bytes) < _ID_SECTION.size:
+            return ["The file is too short to be a RiDat file (%d bytes)." % file_size]
+
+        magic_number = _ID_SECTION.decode_field('MagicNumber', header_bytes)
+        if magic_number != RIDAT_MAGIC_NUMBER:
+            return ["The magic number is %d instead of %d." % (magic_number, RIDAT_MAGIC_NUMBER)]
+        file_version = _ID_SECTION.decode_field('FileVersion', header_bytes)
+        if file_version != 0:
+            return ["The file version is %d instead of 0%s." % (file_version, " (RiImage)" if file_version == 1 else "")]
+
+        problems, offsets, offset = [], [], 0
+        for name, section, size_field, _ in _VALIDATED_SECTIONS:
+            size = _ID_SECTION.decode_field(size_field, header_bytes)
+            if size < section.size:
+                problems.append("The %s section has %d bytes (%s), less than the %d bytes of its layout."
+                                % (name, size, size_field, section.size))
+            elif offset + size > file_size:
+                problems.append("The %s section ends at byte %d, after the end of the file (%d bytes)."
+                                % (name, offset + size, file_size))
+            offsets.append(offset)
+            offset += size
+        if problems:
+            return problems
+
+        data_size = file_size - offset
+        if data_size % RIDAT_RECORD_DTYPE.itemsize:
+            problems.append("The data section has a truncated record (%d trailing bytes)."
+                            % (data_size % RIDAT_RECORD_DTYPE.itemsize))
+
+        # the end marks are the last field of each layout. Sections larger than usual may need a second read.
+        header_end = max(section_offset + section.size
+                         for section_offset, (_, section, _, _) in zip(offsets, _VALIDATED_SECTIONS))
+        if header_end > len(header_bytes):
+            header_bytes += ridat_file.read(header_end - len(header_bytes))
+        end_marks = [(name, section.decode_field(end_mark_field, header_bytes, section_offset))
+                     for section_offset, (name, section, _, end_mark_field) in zip(offsets, _VALIDATED_SECTIONS)]
+        if end_mark is not None:
+            for name, value in end_marks:
+                if value != end_mark:
+                    problems.append("The end mark of the %s section is %d instead of %d." % (name, value, end_mark))
+        elif len(set(value for _, value in end_marks)) > 1:
+            problems.append("The end marks of the sections differ (%s)."
+                            % ', '.join('%s: %d' % (name, value) for name, value in end_marks))
+    return problems
+
+
+def _validate_ridat_file(f_path, end_mark):
+    try:
+        return validate_ridat_file(f_path, end_mark)
+    except (IOError, OSError) as error:
+        return ["Could not read the file: %s" % error]
+
+
+# Validates every .RiDat file under "root" with validate_ridat_file, in "workers" threads (the checks are a few small
+# reads per file, so they are bound by the storage latency, not by the CPU). Only a bounded number of files is
+# queued at a time, so archives of any size can be swept with constant memory.
+# Returns a report with the number of files scanned and, in "bad", the problems of each invalid file (by path
+# relative to root), and of each directory that could not be listed.
+def scan_ridat_archive(root, workers=None, end_mark=None, log=print):
+    workers = workers or min(32, (os.cpu_count() or 1) * 4)
+    start = time.perf_counter()
+    scanned, bad, pending, walk_errors = 0, {}, {}, []
+
+    def collect(done):
+        for future in done:
+            relative_path = pending.pop(future)
+            problems = future.result()
+            if problems:
+                bad[relative_path] = problems
+                log("%s: %s" % (relative_path, ' '.join(problems)))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for ridat_path in _find_ridat_files(root, onerror=walk_errors.append):
+            if len(pending) >= workers * 4:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                collect(done)
+            relative_path = os.path.relpath(ridat_path, root).replace(os.sep, '/')
+            pending[executor.submit(_validate_ridat_file, ridat_path, end_mark)] = relative_path
+            scanned += 1
+        collect(list(pending))
+
+    for error in walk_errors:
+        relative_path = os.path.relpath(error.filename, root).replace(os.sep, '/')
+        bad[relative_path] = ["Could not list the directory: %s" % error]
+        log("%s: %s" % (relative_path, bad[relative_path][0]))
+
+    elapsed = time.perf_counter() - start
+    report = {'scanned': scanned, 'bad': dict(sorted(bad.items())), 'seconds': elapsed,
+              'files_per_second': scanned / elapsed if elapsed else 0.0}
+    log("Scanned %d files in %.2f s (%.1f files/s): %d bad" % (scanned, elapsed, report['files_per_second'], len(bad)))
+    return report
+
+
+# ###################################################################################################
+# ####################################################################################### COMMAND LINE
+
+RIDAT_MANIFEST_NAME = 'ridat_manifest.json'
+
+# the manifest is saved every that many converted files or seconds, so an interrupted run keeps most of its work.
+_MANIFEST_FLUSH_FILES = 100
+_MANIFEST_FLUSH_SECONDS = 30.0
+
+
+def _file_sha256(f_path, block_size=1 << 20):
+    sha256 = hashlib.sha256()
+    with open(f_path, 'rb') as read_file:
+        for block in iter(lambda: read_file.read(block_size), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+# converts one file, unless its content hash is still "previous_hash" and the output exists.
+# Returns the content hash of the source, and whether it was converted.
+def _convert_ridat_file(ridat_path, save_path, file_format, previous_hash, with_parameters):
+    content_hash = _file_sha256(ridat_path)
+    if content_hash == previous_hash and os.path.exists(save_path):
+        return content_hash, False
+    save_dir = os.path.dirname(save_path)
+    if save_dir:
+        os.makedirs(save_dir, exist_ok=True)
+    parameters_path = os.path.splitext(save_path)[0] + '.json' if with_parameters else None
+    export_ridat_data(ridat_path, save_path, file_format, parameters_path=parameters_path)
+    return content_hash, True
+
+
+# written to a temporary file first, so the manifest on disk is always complete.
+def _write_manifest(manifest_path, manifest):
+    os.makedirs(os.path.dirname(manifest_path) or '.', exist_ok=True)
+    with open(manifest_path + '.tmp', 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+
+# "onerror" is called with the OSError of each directory that can not be listed (see os.walk).
+def _find_ridat_files(root, onerror=None):
+    for dir_path, dir_names, file_names in os.walk(root, onerror=onerror):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            if file_name.lower().endswith('.ridat'):
+                yield os.path.join(dir_path, file_name)
+
+
+# Converts every .RiDat file under "source_dir" to "file_format", mirroring the directory tree inside "output_dir".
+# The size, mtime and SHA-256 of each source (and the options it was converted with) are kept in a manifest inside
+# output_dir, so files that did not change since the previous run with the same options are skipped. The manifest
+# is also saved while the conversion runs (and when it is interrupted), merged with the entries of the previous run
+# that were not processed yet, so a new run resumes where the last one stopped.
+# Returns a dictionary with the counts of converted, skipped and failed files.
+def convert_ridat_tree(source_dir, output_dir, file_format='npz', workers=None, with_parameters=False, log=print):
+    manifest_path = os.path.join(output_dir, RIDAT_MANIFEST_NAME)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+
+    start = time.perf_counter()
+    new_manifest, tasks = {}, {}
+    converted, skipped, failed, converted_bytes = 0, 0, [], 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for ridat_path in _find_ridat_files(source_dir):
+            relative_path = os.path.relpath(ridat_path, source_dir).replace(os.sep, '/')
+            save_path = os.path.join(output_dir, os.path.splitext(relative_path)[0] + '.' + file_format)
+            file_stat = os.stat(ridat_path)
+            entry = manifest.get(relative_path, {})
+
+            # fast path: same size and mtime as in the last run, so the content is not even hashed.
+            same_output = (entry.get('format') == file_format
+                           and entry.get('parameters', False) == with_parameters)
+            if (entry.get('size') == file_stat.st_size and entry.get('mtime') == file_stat.st_mtime_ns
+                    and same_output and os.path.exists(save_path)):
+                new_manifest[relative_path] = entry
+                skipped += 1
+                continue
+
+            previous_hash = entry.get('sha256') if same_output else None
+            future = executor.submit(_convert_ridat_file, ridat_path, save_path, file_format, previous_hash,
+                                     with_parameters)
+            tasks[future] = (relative_path, file_stat)
+
+        last_flush, unflushed = time.perf_counter(), 0
+        try:
+            for future in concurrent.futures.as_completed(tasks):
+                relative_path, file_stat = tasks[future]
+                try:
+                    content_hash, was_converted = future.result()
+                except Exception as error:
+                    failed.append(relative_path)
+                    log("Failed to convert %s: %s" % (relative_path, error))
+                else:
+                    new_manifest[relative_path] = {'size': file_stat.st_size, 'mtime': file_stat.st_mtime_ns,
+                                                   'sha256': content_hash, 'format': file_format,
+                                                   'parameters': with_parameters}
+                    if was_converted:
+                        converted += 1
+                        converted_bytes += file_stat.st_size
+                    else:
+                        skipped += 1
+
+                unflushed += 1
+                if unflushed >= _MANIFEST_FLUSH_FILES or time.perf_counter() - last_flush >= _MANIFEST_FLUSH_SECONDS:
+                    _write_manifest(manifest_path, dict(manifest, **new_manifest))
+                    last_flush, unflushed = time.perf_counter(), 0
+        except BaseException:
+            _write_manifest(manifest_path, dict(manifest, **new_manifest))
+            raise
+
+    # the final manifest only has the files that are still in the source tree.
+    _write_manifest(manifest_path, new_manifest)
+
+    elapsed = time.perf_counter() - start
+    report = {'converted': converted, 'skipped': skipped, 'failed': failed, 'seconds': elapsed,
+              'files_per_second': converted / elapsed if elapsed else 0.0,
+              'mb_per_second': converted_bytes / 1e6 / elapsed if elapsed else 0.0}
+    log("Converted %d files (%d unchanged, %d failed) in %.2f s: %.1f files/s, %.1f MB/s"
+        % (converted, skipped, len(failed), elapsed, report['files_per_second'], report['mb_per_second']))
+    return report
+
+
+# python -m ridat_reader convert <source dir> <output dir> [--format npz] [--workers N] [--parameters]
+# python -m ridat_reader scan <root> [--workers N] [--end-mark N] [--output report.json]
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m ridat_reader', description="Tools for .RiDat files.")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+    convert_parser = subparsers.add_parser('convert', help="convert a directory tree of .RiDat files, skipping "
+                                                           "the files that did not change since the last run")
+    convert_parser.add_argument('source_dir')
+    convert_parser.add_argument('output_dir')
+    convert_parser.add_argument('--format', default='npz', choices=['npz', 'npy', 'parquet', 'arrow'])
+    convert_parser.add_argument('--workers', type=int, default=None, help="number of processes (default: all cores)")
+    convert_parser.add_argument('--parameters', action='store_true', help="also save the parameters as JSON")
+    scan_parser = subparsers.add_parser('scan', help="check the structure of every .RiDat file in a directory tree")
+    scan_parser.add_argument('root')
+    scan_parser.add_argument('--workers', type=int, default=None, help="number of threads")
+    scan_parser.add_argument('--end-mark', type=int, default=None, help="expected value of the section end marks")
+    scan_parser.add_argument('--output', help="save the report in this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.command == 'scan':
+        report = scan_ridat_archive(args.root, args.workers, args.end_mark)
+        if args.output:
+            with open(args.output, 'w') as output_file:
+                json.dump(report, output_file, indent=1)
+        return 1 if report['bad'] else 0
+
+    report = convert_ridat_tree(args.source_dir, args.output_dir, args.format, args.workers, args.parameters)
+    return 1 if report['failed'] else 0
+
 
+if __name__ == '__main__':
+    sys.exit(main())